@@ -15,15 +15,22 @@ Features:
 
 import os
 import asyncio
+import concurrent.futures
 import json
 import uuid
 import shutil
+from collections import deque
 import tempfile
 import subprocess
 import re
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import Optional, Dict, List
 from enum import Enum
+
+import anyio
+from arq import create_pool
+from arq.connections import RedisSettings
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -31,27 +38,85 @@ load_dotenv()
 
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 import uvicorn
 import zipfile
 import tarfile
 
-# Import our agent and rate limiter
+# Import our agent, rate limiter, and job storage
 from rate_limiter import RateLimiter
-from code_architecture_agent import create_architecture_agent
+from job_store import JobStore
+from code_architecture_agent import create_architecture_agent, make_initial_state
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
+# Process pool for running the CPU-bound agent pipeline (AST parsing, graph
+# building) off the event loop and its thread pool
+PROC_POOL: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+# Compiled agent, built once per pool worker by _pool_init
+_AGENT = None
+
+
+def _pool_init():
+    """Build the LangGraph agent once per pool worker instead of per job"""
+    global _AGENT
+    _AGENT = create_architecture_agent()
+
+
+def _invoke_agent(initial_state: dict) -> dict:
+    """Run the LangGraph agent in a pool worker (top-level so it pickles).
+
+    The repo reader node is async (clone I/O), so the worker drives the
+    graph with ainvoke on its own event loop.
+    """
+    agent = _AGENT if _AGENT is not None else create_architecture_agent()
+    return asyncio.run(agent.ainvoke(initial_state))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up and tear down the analysis process pool and job queue"""
+    global PROC_POOL
+    PROC_POOL = concurrent.futures.ProcessPoolExecutor(
+        max_workers=os.cpu_count(), initializer=_pool_init
+    )
+
+    # The default anyio limiter (40 threads) is shared by every sync call in
+    # the app; widen it so analyses don't starve other blocking work
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+
+    # Durable job queue (worker.py) - analyses survive API worker restarts.
+    # Without Redis, jobs fall back to in-process BackgroundTasks.
+    redis_url = os.getenv("REDIS_URL")
+    app.state.arq = await create_pool(RedisSettings.from_dsn(redis_url)) if redis_url else None
+
+    yield
+
+    if app.state.arq:
+        await app.state.arq.close()
+    PROC_POOL.shutdown(wait=False, cancel_futures=True)
+
+
 app = FastAPI(
     title="Code Architecture Analysis API",
     description="AI-powered code architecture analysis using LangGraph",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson encodes in a single C call - matters for multi-MB result payloads
+    default_response_class=ORJSONResponse
 )
 
-allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
+# Compress large responses (markdown + JSON results shrink 5-10x)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Explicit origin list - browsers reject allow_origins=["*"] together with
+# allow_credentials=True anyway
+allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -62,9 +127,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for jobs (use Redis in production)
-jobs_db: Dict[str, dict] = {}
-results_cache: Dict[str, dict] = {}
+# Job and result storage - Redis-backed when REDIS_URL is set (required for
+# multi-worker deployments), in-process dicts otherwise
+job_store = JobStore(os.getenv("REDIS_URL"))
+
+# Rendered markdown reports are written here and served as files, instead of
+# living inside the cached result payload
+RESULTS_DIR = os.getenv("CORTEX_RESULTS_DIR",
+                        os.path.join(tempfile.gettempdir(), "cortex_results"))
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+def _write_text(path: str, text: str):
+    """Write a text file (blocking, run in a thread)"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
 
 # Rate limiter (10 analyses per 24 hours per IP)
 rate_limiter = RateLimiter(max_requests=10, window_hours=24)
@@ -82,6 +159,9 @@ class ConnectionManager:
         if job_id in self.active_connections:
             del self.active_connections[job_id]
 
+    def has(self, job_id: str) -> bool:
+        return job_id in self.active_connections
+
     async def send_update(self, job_id: str, message: dict):
         if job_id in self.active_connections:
             try:
@@ -166,110 +246,124 @@ class AnalysisResult(BaseModel):
 # HELPER FUNCTIONS
 # ============================================================================
 
-def create_job(request: AnalysisRequest) -> str:
+def _now() -> str:
+    """Current UTC timestamp as ISO-8601 (utcnow() is deprecated in 3.12+)"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def create_job(request: AnalysisRequest) -> dict:
     """Create a new analysis job"""
     job_id = str(uuid.uuid4())
-    
-    jobs_db[job_id] = {
+    now = _now()
+
+    job = {
         "job_id": job_id,
         "status": JobStatus.PENDING,
         "request": request.dict(),
-        "created_at": datetime.utcnow().isoformat(),
-        "updated_at": datetime.utcnow().isoformat(),
+        "created_at": now,
+        "updated_at": now,
         "progress": 0,
         "message": "Job created"
     }
-    
-    return job_id
+    await job_store.set_job(job_id, job)
 
+    return job
 
-def update_job_status(job_id: str, status: JobStatus, progress: int = None, message: str = None):
-    """Update job status"""
-    if job_id in jobs_db:
-        jobs_db[job_id]["status"] = status
-        jobs_db[job_id]["updated_at"] = datetime.utcnow().isoformat()
-        
-        if progress is not None:
-            jobs_db[job_id]["progress"] = progress
-        
-        if message:
-            jobs_db[job_id]["message"] = message
+
+async def update_job_status(job_id: str, status: JobStatus, progress: int = None,
+                            message: str = None, now: str = None):
+    """Update job status (callers that already have a timestamp pass it via now)"""
+    fields = {
+        "status": status,
+        "updated_at": now or _now()
+    }
+
+    if progress is not None:
+        fields["progress"] = progress
+
+    if message:
+        fields["message"] = message
+
+    await job_store.update_job(job_id, **fields)
 
 
 async def send_progress_update(job_id: str, step: str, progress: int, message: str):
     """Send progress update via WebSocket"""
+    now = _now()
+
+    # No subscriber (polling clients are common): just persist the status
+    # and skip building and sending the frame
+    if not manager.has(job_id):
+        await update_job_status(job_id, JobStatus.RUNNING, progress, message, now=now)
+        return
+
     update = {
         "type": "progress",
         "job_id": job_id,
         "step": step,
         "progress": progress,
         "message": message,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": now
     }
-    
+
     await manager.send_update(job_id, update)
-    update_job_status(job_id, JobStatus.RUNNING, progress, message)
+    await update_job_status(job_id, JobStatus.RUNNING, progress, message, now=now)
+
+
+def _build_call_adjacency(function_calls: List[dict]) -> Dict[str, list]:
+    """Index function calls by caller (and Class.method) for O(1) call-flow lookups"""
+    adjacency: Dict[str, list] = {}
+
+    for call in function_calls:
+        from_function = call.get("from_function")
+        if not from_function:
+            continue
+
+        adjacency.setdefault(from_function, []).append(call)
+
+        from_class = call.get("from_class")
+        if from_class:
+            adjacency.setdefault(f"{from_class}.{from_function}", []).append(call)
+
+    return adjacency
 
 
 async def run_analysis_async(job_id: str, request: AnalysisRequest):
     """Run the analysis in the background"""
-    start_time = datetime.utcnow()
+    start_time = datetime.now(timezone.utc)
     
     try:
         # Update status
-        update_job_status(job_id, JobStatus.RUNNING, 0, "Starting analysis...")
+        await update_job_status(job_id, JobStatus.RUNNING, 0, "Starting analysis...")
         await send_progress_update(job_id, "initialize", 0, "Initializing agent...")
-        
-        # Create agent
-        agent = create_architecture_agent()
-        
+
         # Prepare initial state
-        initial_state = {
-            "repo_path": request.repo_path,
-            "git_ref": request.git_ref,
-            "scope_filters": request.scope_filters,
-            "depth": request.depth,
-            "file_tree": {},
-            "code_facts": {},
-            "dependency_graph": {},
-            "architecture_patterns": {},
-            "llm_summary": {},
-            "validation_result": {},
-            "final_output": "",
-            "mermaid_diagram": "",
-            "errors": [],
-            "iteration_count": 0,
-            "messages": []
-        }
+        initial_state = make_initial_state(
+            request.repo_path,
+            git_ref=request.git_ref,
+            scope_filters=request.scope_filters,
+            depth=request.depth
+        )
         
-        # Progress tracking
-        steps = [
-            ("repo_reader", 15, "Fetching repository files..."),
-            ("static_analyzer", 30, "Parsing code structure..."),
-            ("graph_builder", 45, "Building dependency graph..."),
-            ("pattern_mapper", 60, "Detecting architecture patterns..."),
-            ("llm_orchestrator", 75, "Analyzing with AI..."),
-            ("validator", 85, "Validating results..."),
-            ("output_renderer", 95, "Generating documentation..."),
-        ]
-        
-        # Run agent with progress updates
         await send_progress_update(job_id, "repo_reader", 10, "Starting analysis...")
-        
-        # Run the agent (blocking call, but in background task)
-        result = await asyncio.to_thread(agent.invoke, initial_state)
-        
-        # Send progress for each completed step
-        for i, (step, progress, message) in enumerate(steps):
-            await send_progress_update(job_id, step, progress, message)
-            await asyncio.sleep(0.1)  # Small delay for UX
-        
+
+        # Run the agent in the process pool - it's CPU-bound and GIL-holding,
+        # so a thread would serialize concurrent analyses
+        result = await asyncio.get_running_loop().run_in_executor(
+            PROC_POOL, _invoke_agent, initial_state
+        )
+
         # Extract results
-        execution_time = (datetime.utcnow() - start_time).total_seconds()
+        execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
 
         # Get Mermaid diagram directly from state (now stored separately)
         mermaid_diagram = result.get("mermaid_diagram", "")
 
+        # The agent keeps facts as slotted records; serialize to plain dicts
+        # here at the JSON boundary
+        code_facts = result.get("code_facts", {})
+        function_calls = [c.to_dict() for c in code_facts.get("function_calls", [])]
+
         # Fallback: try to extract from markdown if not in state
         if not mermaid_diagram and "```mermaid" in result.get("final_output", ""):
             try:
@@ -298,8 +392,10 @@ async def run_analysis_async(job_id: str, request: AnalysisRequest):
             "recommendations": result.get("llm_summary", {}).get("recommendations", []),
             "overall_architecture": result.get("llm_summary", {}).get("overall_architecture", ""),
             
-            # Full outputs
-            "markdown_output": result.get("final_output", ""),
+            # Full outputs - the markdown report goes to disk and is served
+            # via a streamed FileResponse instead of sitting in the cache and
+            # being re-serialized on every result fetch
+            "markdown_url": f"/api/results/{job_id}/markdown",
             "mermaid_diagram": mermaid_diagram,
             
             # Graph data (for visualization)
@@ -311,10 +407,10 @@ async def run_analysis_async(job_id: str, request: AnalysisRequest):
 
             # Code facts (for call flow analysis)
             "code_facts": {
-                "symbols": result.get("code_facts", {}).get("symbols", []),
-                "function_calls": result.get("code_facts", {}).get("function_calls", []),
-                "class_relationships": result.get("code_facts", {}).get("class_relationships", []),
-                "imports": result.get("code_facts", {}).get("imports", []),
+                "symbols": [s.to_dict() for s in code_facts.get("symbols", [])],
+                "function_calls": function_calls,
+                "class_relationships": [r.to_dict() for r in code_facts.get("class_relationships", [])],
+                "imports": [i.to_dict() for i in code_facts.get("imports", [])],
             },
 
             # Metadata
@@ -324,38 +420,54 @@ async def run_analysis_async(job_id: str, request: AnalysisRequest):
             "messages": result.get("messages", [])
         }
         
-        # Cache result
-        results_cache[job_id] = analysis_result
-        
+        # Persist the markdown report, then cache the (now slimmer) result
+        await asyncio.to_thread(
+            _write_text,
+            os.path.join(RESULTS_DIR, f"{job_id}.md"),
+            result.get("final_output", "")
+        )
+        await job_store.set_result(job_id, analysis_result)
+        # Caller -> calls index, built once so /callflow doesn't rescan the
+        # full call list on every request. Stored apart from the result so
+        # it never rides along in the REST payload
+        await job_store.set_call_index(job_id, _build_call_adjacency(function_calls))
+
         # Update job status
-        update_job_status(job_id, JobStatus.COMPLETED, 100, "Analysis completed!")
+        await update_job_status(job_id, JobStatus.COMPLETED, 100, "Analysis completed!")
         
-        # Send completion via WebSocket
+        # Send completion via WebSocket - just a pointer and a small summary;
+        # the heavy payload is already cached and fetched via REST on demand
         await manager.send_update(job_id, {
             "type": "complete",
             "job_id": job_id,
-            "result": analysis_result
+            "result_url": f"/api/results/{job_id}",
+            "summary": {
+                "file_count": analysis_result["file_count"],
+                "symbol_count": analysis_result["symbol_count"],
+                "pattern_count": analysis_result["pattern_count"],
+                "execution_time": execution_time
+            }
         })
         
     except Exception as e:
         # Handle errors
         error_message = str(e)
         
-        update_job_status(job_id, JobStatus.FAILED, message=error_message)
-        
+        await update_job_status(job_id, JobStatus.FAILED, message=error_message)
+
         # Send error via WebSocket
         await manager.send_update(job_id, {
             "type": "error",
             "job_id": job_id,
             "error": error_message
         })
-        
+
         # Store partial result
-        results_cache[job_id] = {
+        await job_store.set_result(job_id, {
             "job_id": job_id,
             "status": JobStatus.FAILED,
             "error": error_message
-        }
+        })
 
 
 # ============================================================================
@@ -375,15 +487,53 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
+    jobs = await job_store.list_jobs()
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "active_jobs": len([j for j in jobs_db.values() if j["status"] == JobStatus.RUNNING]),
-        "total_jobs": len(jobs_db),
-        "cached_results": len(results_cache)
+        "timestamp": _now(),
+        "active_jobs": len([j for j in jobs if j["status"] == JobStatus.RUNNING]),
+        "total_jobs": len(jobs),
+        "cached_results": await job_store.count_results()
     }
 
 
+def _extract_and_count(file_path: str, extract_dir: str, filename: str):
+    """Extract an uploaded archive and count its files (blocking, run in a thread).
+
+    The file count and the single-root-directory detection both come from the
+    archive listing, so the extracted tree is never walked a second time.
+    """
+    if filename.endswith('.zip'):
+        with zipfile.ZipFile(file_path, 'r') as zip_ref:
+            names = zip_ref.namelist()
+            file_count = sum(1 for n in names if not n.endswith('/'))
+            zip_ref.extractall(extract_dir)
+    else:
+        with tarfile.open(file_path, 'r:*') as tar_ref:
+            members = tar_ref.getmembers()
+            names = [m.name for m in members]
+            file_count = sum(1 for m in members if m.isfile())
+            tar_ref.extractall(extract_dir)
+
+    # Handle nested directories (common with ZIP files)
+    # If every entry sits under one top-level directory, use that as the root
+    top_levels = {n.removeprefix('./').split('/', 1)[0] for n in names}
+    top_levels.discard('')
+    # tar archives made with `tar -C dir .` carry a bare "." member
+    top_levels.discard('.')
+    if len(top_levels) == 1:
+        single_item = os.path.join(extract_dir, top_levels.pop())
+        if os.path.isdir(single_item):
+            # Use the nested directory as the root
+            extract_dir = single_item
+
+    return extract_dir, file_count
+
+
+# Upload size cap (default 500MB) - enforced before and during streaming
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     """
@@ -391,41 +541,35 @@ async def upload_file(file: UploadFile = File(...)):
 
     Returns the temporary path where the file was extracted.
     """
+    # Reject bad uploads before touching the disk
+    if not file.filename or not file.filename.endswith(('.zip', '.tar', '.tar.gz', '.tgz')):
+        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload ZIP or TAR files.")
+
+    if file.size and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum upload size is {MAX_UPLOAD_BYTES} bytes.")
+
     try:
         # Create temp directory
         temp_dir = tempfile.mkdtemp(prefix="cortex_upload_")
 
-        # Save uploaded file
+        # Stream the upload to disk in 1MB chunks - keeps memory flat
+        # regardless of archive size. The running total backs up the size
+        # check for clients that don't declare Content-Length.
         file_path = os.path.join(temp_dir, file.filename)
+        total_bytes = 0
         with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Extract based on file type
-        extract_dir = os.path.join(temp_dir, "extracted")
-        os.makedirs(extract_dir, exist_ok=True)
-
-        if file.filename.endswith('.zip'):
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-        elif file.filename.endswith('.tar') or file.filename.endswith('.tar.gz') or file.filename.endswith('.tgz'):
-            with tarfile.open(file_path, 'r:*') as tar_ref:
-                tar_ref.extractall(extract_dir)
-        else:
-            shutil.rmtree(temp_dir)
-            raise HTTPException(status_code=400, detail="Unsupported file type. Please upload ZIP or TAR files.")
-
-        # Handle nested directories (common with ZIP files)
-        # If extract_dir contains only one subdirectory, use that as the root
-        contents = os.listdir(extract_dir)
-        if len(contents) == 1:
-            single_item = os.path.join(extract_dir, contents[0])
-            if os.path.isdir(single_item):
-                # Use the nested directory as the root
-                extract_dir = single_item
-
-        # Count files to verify extraction
-        file_count = sum(1 for root, dirs, files in os.walk(extract_dir) for f in files)
+            while chunk := await file.read(1 << 20):
+                total_bytes += len(chunk)
+                if total_bytes > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File too large. Maximum upload size is {MAX_UPLOAD_BYTES} bytes.")
+                f.write(chunk)
+
+        # Extraction and the file-count walk are blocking - run off the loop
+        extract_root = os.path.join(temp_dir, "extracted")
+        os.makedirs(extract_root, exist_ok=True)
+        extract_dir, file_count = await asyncio.to_thread(
+            _extract_and_count, file_path, extract_root, file.filename
+        )
 
         return {
             "success": True,
@@ -435,13 +579,18 @@ async def upload_file(file: UploadFile = File(...)):
             "message": f"File uploaded and extracted to {extract_dir} ({file_count} files found)"
         }
 
+    except HTTPException:
+        # Deliberate rejections (e.g. size cap hit mid-stream) keep their status
+        if 'temp_dir' in locals() and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
     except Exception as e:
         if 'temp_dir' in locals() and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
 
 
-@app.post("/api/analyze", response_model=JobResponse)
+@app.post("/api/analyze")
 async def start_analysis(analysis_request: AnalysisRequest, request: Request, background_tasks: BackgroundTasks):
     """
     Start a new code architecture analysis.
@@ -453,46 +602,52 @@ async def start_analysis(analysis_request: AnalysisRequest, request: Request, ba
     await rate_limiter.check_rate_limit(request)
 
     # Create job
-    job_id = create_job(analysis_request)
-
-    # Start analysis in background
-    background_tasks.add_task(run_analysis_async, job_id, analysis_request)
-
-    return JobResponse(
-        job_id=job_id,
-        status=JobStatus.PENDING,
-        created_at=jobs_db[job_id]["created_at"],
-        updated_at=jobs_db[job_id]["updated_at"],
-        progress=0,
-        message="Analysis queued"
-    )
+    job = await create_job(analysis_request)
+    job_id = job["job_id"]
+
+    # Enqueue on the durable queue when available, otherwise run in-process
+    if app.state.arq:
+        await app.state.arq.enqueue_job("analyze_job", job_id, analysis_request.dict())
+    else:
+        background_tasks.add_task(run_analysis_async, job_id, analysis_request)
 
+    # Plain dict response - skips Pydantic model construction/validation on
+    # a hot status path (input validation stays on AnalysisRequest)
+    return {
+        "job_id": job_id,
+        "status": JobStatus.PENDING,
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "progress": 0,
+        "message": "Analysis queued"
+    }
 
-@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+
+@app.get("/api/jobs/{job_id}")
 async def get_job_status(job_id: str):
     """Get the status of a specific job"""
-    if job_id not in jobs_db:
+    job = await job_store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    
-    job = jobs_db[job_id]
-    
-    return JobResponse(
-        job_id=job["job_id"],
-        status=job["status"],
-        created_at=job["created_at"],
-        updated_at=job["updated_at"],
-        progress=job.get("progress", 0),
-        message=job.get("message", "")
-    )
+
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "progress": job.get("progress", 0),
+        "message": job.get("message", "")
+    }
 
 
-@app.get("/api/results/{job_id}")
+@app.get("/api/results/{job_id}", response_class=ORJSONResponse)
 async def get_analysis_result(job_id: str):
     """Get the analysis results for a completed job"""
-    if job_id not in results_cache:
+    result = await job_store.get_result(job_id)
+    if result is None:
         # Check if job exists but not completed
-        if job_id in jobs_db:
-            job = jobs_db[job_id]
+        job = await job_store.get_job(job_id)
+        if job is not None:
             if job["status"] == JobStatus.RUNNING or job["status"] == JobStatus.PENDING:
                 raise HTTPException(
                     status_code=202,
@@ -506,7 +661,17 @@ async def get_analysis_result(job_id: str):
 
         raise HTTPException(status_code=404, detail="Results not found")
 
-    return results_cache[job_id]
+    return result
+
+
+@app.get("/api/results/{job_id}/markdown")
+async def get_analysis_markdown(job_id: str):
+    """Download the rendered markdown report for a completed job"""
+    path = os.path.join(RESULTS_DIR, f"{job_id}.md")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Markdown report not found")
+
+    return FileResponse(path, media_type="text/markdown")
 
 
 @app.get("/api/results/{job_id}/callflow/{method_name}")
@@ -517,58 +682,20 @@ async def get_call_flow(job_id: str, method_name: str, max_depth: int = 5):
     Returns all methods/functions called from the specified starting point,
     up to max_depth levels deep.
     """
-    if job_id not in results_cache:
+    results = await job_store.get_result(job_id)
+    if results is None:
         raise HTTPException(status_code=404, detail="Results not found")
 
-    results = results_cache[job_id]
-
-    # Extract function calls from code_facts (stored in messages during analysis)
-    # For now, we'll need to re-analyze or store this data
-    # Let's create a simple call flow tracer
-
-    def trace_calls(start_method, function_calls, max_depth, current_depth=0, visited=None):
-        """Recursively trace function calls from a starting method"""
-        if visited is None:
-            visited = set()
-
-        if current_depth >= max_depth or start_method in visited:
-            return []
-
-        visited.add(start_method)
-
-        # Find all calls from this method
-        direct_calls = [
-            {
-                "from": call["from_function"],
-                "from_class": call.get("from_class"),
-                "to": call["to_function"],
-                "file": call["file"],
-                "line": call["line"],
-                "depth": current_depth
-            }
-            for call in function_calls
-            if call.get("from_function") == start_method or
-               f"{call.get('from_class', '')}.{call.get('from_function', '')}" == start_method
-        ]
-
-        # Recursively trace calls from each called function
-        all_calls = direct_calls.copy()
-        for call in direct_calls:
-            nested_calls = trace_calls(
-                call["to"],
-                function_calls,
-                max_depth,
-                current_depth + 1,
-                visited
-            )
-            all_calls.extend(nested_calls)
-
-        return all_calls
-
-    # Get function calls from the cached results
-    function_calls = results.get("code_facts", {}).get("function_calls", [])
+    # Use the caller index built at analysis time (stored server-side,
+    # apart from the result); fall back to building it here for results
+    # cached before the index existed
+    adjacency = await job_store.get_call_index(job_id)
+    if adjacency is None:
+        adjacency = _build_call_adjacency(
+            results.get("code_facts", {}).get("function_calls", [])
+        )
 
-    if not function_calls:
+    if not adjacency:
         return {
             "start_method": method_name,
             "max_depth": max_depth,
@@ -578,21 +705,39 @@ async def get_call_flow(job_id: str, method_name: str, max_depth: int = 5):
         }
 
     # Get list of all available methods for suggestions
-    available_methods = list(set([
-        call["from_function"]
-        for call in function_calls
-        if call.get("from_function")
-    ]))
+    available_methods = sorted(adjacency.keys())
 
-    # Trace the calls
-    traced_calls = trace_calls(method_name, function_calls, max_depth)
+    # BFS over the adjacency index - each reachable edge is visited once
+    traced_calls = []
+    visited = {method_name}
+    queue = deque([(method_name, 0)])
+
+    while queue:
+        method, depth = queue.popleft()
+        if depth >= max_depth:
+            continue
+
+        for call in adjacency.get(method, ()):
+            traced_calls.append({
+                "from": call["from_function"],
+                "from_class": call.get("from_class"),
+                "to": call["to_function"],
+                "file": call["file"],
+                "line": call["line"],
+                "depth": depth
+            })
+
+            callee = call["to_function"]
+            if callee not in visited:
+                visited.add(callee)
+                queue.append((callee, depth + 1))
 
     call_flow = {
         "start_method": method_name,
         "max_depth": max_depth,
         "calls": traced_calls,
         "total_calls": len(traced_calls),
-        "available_methods": sorted(available_methods)[:100],  # Limit to 100 for dropdown
+        "available_methods": available_methods[:100],  # Limit to 100 for dropdown
         "message": f"Found {len(traced_calls)} function calls in the call flow" if traced_calls else f"No calls found from '{method_name}'. Method may not exist or doesn't call other functions."
     }
 
@@ -602,7 +747,7 @@ async def get_call_flow(job_id: str, method_name: str, max_depth: int = 5):
 @app.get("/api/jobs")
 async def list_jobs(status: Optional[JobStatus] = None, limit: int = 50):
     """List all jobs, optionally filtered by status"""
-    jobs_list = list(jobs_db.values())
+    jobs_list = await job_store.list_jobs()
     
     if status:
         jobs_list = [j for j in jobs_list if j["status"] == status]
@@ -622,18 +767,23 @@ async def list_jobs(status: Optional[JobStatus] = None, limit: int = 50):
 @app.delete("/api/jobs/{job_id}")
 async def delete_job(job_id: str):
     """Delete a job and its results"""
-    if job_id not in jobs_db:
+    job = await job_store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    
+
     # Can't delete running jobs
-    if jobs_db[job_id]["status"] == JobStatus.RUNNING:
+    if job["status"] == JobStatus.RUNNING:
         raise HTTPException(status_code=400, detail="Cannot delete running job")
-    
-    # Delete from both databases
-    del jobs_db[job_id]
-    if job_id in results_cache:
-        del results_cache[job_id]
-    
+
+    # Delete from both databases, plus the on-disk markdown report
+    await job_store.delete_job(job_id)
+    await job_store.delete_result(job_id)
+    await job_store.delete_call_index(job_id)
+
+    markdown_path = os.path.join(RESULTS_DIR, f"{job_id}.md")
+    if os.path.exists(markdown_path):
+        os.remove(markdown_path)
+
     return {"message": "Job deleted successfully"}
 
 
@@ -655,19 +805,34 @@ async def websocket_endpoint(websocket: WebSocket, job_id: str):
             "message": "WebSocket connected"
         })
         
-        # Keep connection alive
-        while True:
-            # Wait for messages (heartbeat)
-            data = await websocket.receive_text()
-            
+        # Keep connection alive; iter_text handles close frames cleanly
+        async for data in websocket.iter_text():
             # Echo heartbeat
             if data == "ping":
                 await websocket.send_text("pong")
-    
+
+        # iter_text returns (rather than raising) on a clean close
+        manager.disconnect(job_id)
+
     except WebSocketDisconnect:
         manager.disconnect(job_id)
 
 
+async def _git(work_dir: str, *args: str):
+    """Run a git command without blocking the event loop.
+
+    Returns (returncode, stdout). `git -C` works for both normal and bare
+    repository directories.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "git", "-C", work_dir, *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, _ = await proc.communicate()
+    return proc.returncode, stdout.decode(errors="ignore")
+
+
 @app.get("/api/git-history")
 async def get_git_history(repo: str):
     """
@@ -701,48 +866,42 @@ async def get_git_history(repo: str):
 
             try:
                 # Use --bare for minimal clone (just git data, no working tree)
-                result = subprocess.run(
-                    ["git", "clone", "--bare", repo_path, temp_dir],
-                    capture_output=True,
-                    text=True,
-                    timeout=60  # 1 minute timeout for git history
+                proc = await asyncio.create_subprocess_exec(
+                    "git", "clone", "--bare", repo_path, temp_dir,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
                 )
+                try:
+                    _, stderr = await asyncio.wait_for(proc.communicate(), timeout=60)
+                except asyncio.TimeoutError:
+                    # Don't leave the clone running and writing into the
+                    # temp dir that's about to be removed
+                    proc.kill()
+                    raise
 
-                if result.returncode != 0:
-                    raise Exception(f"Git clone failed: {result.stderr}")
+                if proc.returncode != 0:
+                    raise Exception(f"Git clone failed: {stderr.decode(errors='ignore')}")
 
-                # For bare repos, we don't use -C, just run commands in the repo directory
                 work_dir = temp_dir
-                use_c_flag = False
-            except subprocess.TimeoutExpired:
+            except asyncio.TimeoutError:
                 raise Exception("Repository clone timed out")
         else:
             # Local path
             work_dir = repo_path
-            use_c_flag = True
-
-        # Get branches
-        try:
-            if use_c_flag:
-                # For normal repos
-                branches_output = subprocess.run(
-                    ["git", "-C", work_dir, "branch", "-r"],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-            else:
-                # For bare repos, list remote branches
-                branches_output = subprocess.run(
-                    ["git", "branch", "-r"],
-                    cwd=work_dir,
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
 
-            branches = []
-            for line in branches_output.stdout.split('\n'):
+        # The four git queries are independent - run them concurrently
+        (remote_rc, remote_out), (local_rc, local_out), (tags_rc, tags_out), (log_rc, log_out) = \
+            await asyncio.gather(
+                _git(work_dir, "branch", "-r"),
+                _git(work_dir, "branch"),
+                _git(work_dir, "tag", "-l"),
+                _git(work_dir, "log", "-10", "--pretty=format:%H|%s|%ai")
+            )
+
+        # Parse branches (remote first, then local ones not already seen)
+        branches = []
+        if remote_rc == 0:
+            for line in remote_out.split('\n'):
                 line = line.strip()
                 if line and not line.startswith('origin/HEAD'):
                     # Remove 'origin/' prefix
@@ -750,66 +909,22 @@ async def get_git_history(repo: str):
                     if branch:
                         branches.append(branch)
 
-            # Also get local branches (for non-bare repos)
-            if use_c_flag:
-                try:
-                    local_branches_output = subprocess.run(
-                        ["git", "-C", work_dir, "branch"],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    for line in local_branches_output.stdout.split('\n'):
-                        line = line.strip().replace('* ', '')
-                        if line and line not in branches:
-                            branches.append(line)
-                except subprocess.CalledProcessError:
-                    pass  # Ignore if local branches fail
-
-        except subprocess.CalledProcessError as e:
-            print(f"Error fetching branches: {e.stderr}")
+        if local_rc == 0:
+            for line in local_out.split('\n'):
+                line = line.strip().replace('* ', '')
+                if line and line not in branches:
+                    branches.append(line)
+
+        if not branches:
             branches = ["main"]  # Default to main only
 
-        # Get tags
-        try:
-            if use_c_flag:
-                tags_output = subprocess.run(
-                    ["git", "-C", work_dir, "tag", "-l"],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-            else:
-                tags_output = subprocess.run(
-                    ["git", "tag", "-l"],
-                    cwd=work_dir,
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-            tags = [tag.strip() for tag in tags_output.stdout.split('\n') if tag.strip()]
-        except subprocess.CalledProcessError:
-            tags = []
-
-        # Get recent commits (last 10)
-        try:
-            if use_c_flag:
-                commits_output = subprocess.run(
-                    ["git", "-C", work_dir, "log", "-10", "--pretty=format:%H|%s|%ai"],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-            else:
-                commits_output = subprocess.run(
-                    ["git", "log", "-10", "--pretty=format:%H|%s|%ai"],
-                    cwd=work_dir,
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-            recent_commits = []
-            for line in commits_output.stdout.split('\n'):
+        # Parse tags
+        tags = [tag.strip() for tag in tags_out.split('\n') if tag.strip()] if tags_rc == 0 else []
+
+        # Parse recent commits (last 10)
+        recent_commits = []
+        if log_rc == 0:
+            for line in log_out.split('\n'):
                 if line.strip():
                     parts = line.split('|')
                     if len(parts) == 3:
@@ -818,8 +933,6 @@ async def get_git_history(repo: str):
                             "message": parts[1],
                             "date": parts[2]
                         })
-        except subprocess.CalledProcessError:
-            recent_commits = []
 
         return {
             "branches": branches[:20],  # Limit to 20 branches
@@ -907,8 +1020,12 @@ if __name__ == "__main__":
     print("\n" + "=" * 80)
     
     uvicorn.run(
-        app,
+        "backend_server:app",
         host="0.0.0.0",
         port=8000,
+        workers=int(os.getenv("UVICORN_WORKERS", "1")),
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
         log_level="info"
     )
@@ -15,17 +15,26 @@ Architecture Components:
 """
 
 import os
+import asyncio
 import subprocess
 import tempfile
 import shutil
 import re
 import ast
+import zlib
+import tarfile
 from typing import TypedDict, Annotated, Literal
 from dataclasses import dataclass, field
-import operator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import bisect
+import heapq
+import io
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain, islice
 import json
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, date
 import fnmatch
 
 # LangGraph imports
@@ -36,11 +45,47 @@ from langchain_core.messages import HumanMessage, SystemMessage
 # NetworkX for graph operations
 import networkx as nx
 
+# igraph's C core computes degree/community metrics orders of magnitude
+# faster than pure-Python networkx on large graphs; optional, with a
+# networkx fallback when the wheel isn't available
+try:
+    import igraph as _igraph
+except ImportError:
+    _igraph = None
+
+# orjson (already a server dependency) encodes/decodes the large prompt and
+# LLM-response payloads several times faster than stdlib json; fall back to
+# json when running without it
+try:
+    import orjson
+
+    def _json_dumps_indented(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps_indented(obj) -> str:
+        return json.dumps(obj, indent=2)
+
+    _json_loads = json.loads
+
 
 # ============================================================================
 # STATE DEFINITION
 # ============================================================================
 
+def _append(acc: list, new: list) -> list:
+    """
+    Reducer for accumulating channels.
+
+    operator.add builds a brand-new list on every merge - O(n) per node and
+    O(n²) across a run as messages grow. Extending in place keeps appends
+    amortized O(1) with identical semantics for our single-writer graph.
+    """
+    acc.extend(new)
+    return acc
+
+
 class AgentState(TypedDict):
     """
     Central state object that flows through all nodes in the graph.
@@ -49,6 +94,10 @@ class AgentState(TypedDict):
     - Type safety: Ensures all nodes work with consistent data structure
     - Reducer functions: Allow multiple nodes to update the same field
     - Transparency: Makes data flow explicit and traceable
+
+    Nodes return only the fields they changed - LangGraph merges deltas into
+    the state, so splatting **state back would just shallow-copy megabytes of
+    file contents and facts on every transition.
     """
     # Input parameters
     repo_path: str
@@ -67,110 +116,478 @@ class AgentState(TypedDict):
     mermaid_diagram: str  # Mermaid diagram for visualization
 
     # Metadata and control flow
-    errors: Annotated[list[str], operator.add]  # Accumulate errors from any step
+    errors: Annotated[list[str], _append]  # Accumulate errors from any step
     iteration_count: int  # Track validation iterations
-    messages: Annotated[list, operator.add]  # Accumulate messages for debugging
+    messages: Annotated[list, _append]  # Accumulate messages for debugging
+
+
+# Shared skeleton for the empty channels so call sites don't rebuild the
+# same literal per run. The dict/str/int values are never mutated in place
+# (nodes return replacement deltas), so sharing them is safe.
+_EMPTY_STATE = {
+    "file_tree": {},
+    "code_facts": {},
+    "dependency_graph": {},
+    "architecture_patterns": {},
+    "llm_summary": {},
+    "validation_result": {},
+    "final_output": "",
+    "mermaid_diagram": "",
+    "iteration_count": 0,
+}
+
+
+def make_initial_state(repo_path: str, git_ref: str = "main",
+                       scope_filters: list[str] | None = None,
+                       depth: int = -1) -> dict:
+    """Build a fresh AgentState for one analysis run.
+
+    The errors/messages channels get new lists each time because their
+    _append reducer extends them in place.
+    """
+    return {
+        **_EMPTY_STATE,
+        "repo_path": repo_path,
+        "git_ref": git_ref,
+        "scope_filters": scope_filters or [],
+        "depth": depth,
+        "errors": [],
+        "messages": [],
+    }
+
+
+# ============================================================================
+# CODE FACT RECORDS
+# ============================================================================
+# Compact slotted records for the static-analyzer output. A dict per symbol
+# costs ~230 bytes of hash table for the same 4-6 keys repeated hundreds of
+# thousands of times on big repos; slots cut that to a fixed struct and make
+# downstream access plain attribute loads. to_dict() is only called at the
+# serialization boundary.
+
+@dataclass(slots=True)
+class Symbol:
+    """A class/function/method/table definition found in a file"""
+    name: str
+    type: str
+    file: str
+    line: int = 0
+    end_line: int = 0
+    col: int = 0
+    bases: list = field(default_factory=list)
+    class_: str = None  # Enclosing class for methods ("class" key in dicts)
+
+    def to_dict(self) -> dict:
+        d = {
+            "name": self.name,
+            "type": self.type,
+            "file": self.file,
+            "line": self.line,
+            "end_line": self.end_line,
+            "col": self.col,
+            "bases": self.bases,
+        }
+        if self.class_:
+            d["class"] = self.class_
+        return d
+
+
+@dataclass(slots=True)
+class Import:
+    """An import/require/include statement ('from' is the importing file)"""
+    from_file: str
+    module: str
+    symbol: str
+
+    def to_dict(self) -> dict:
+        return {"from": self.from_file, "module": self.module, "symbol": self.symbol}
+
+
+@dataclass(slots=True)
+class Call:
+    """A call site attributed to its enclosing function/class"""
+    from_function: str
+    from_class: str
+    to_function: str
+    file: str
+    line: int
+
+    def to_dict(self) -> dict:
+        return {
+            "from_function": self.from_function,
+            "from_class": self.from_class,
+            "to_function": self.to_function,
+            "file": self.file,
+            "line": self.line,
+        }
+
+
+@dataclass(slots=True)
+class Relation:
+    """A class-level relationship (currently only inheritance)"""
+    from_class: str
+    to_class: str
+    type: str
+    file: str
+
+    def to_dict(self) -> dict:
+        return {
+            "from_class": self.from_class,
+            "to_class": self.to_class,
+            "type": self.type,
+            "file": self.file,
+        }
 
 
 # ============================================================================
 # COMPONENT 1: REPO READER (R)
 # ============================================================================
 
+# Extension -> language map, built once at import instead of per call
+_EXT_MAP = {
+    # Python
+    '.py': 'python',
+    '.pyx': 'python',
+    '.pyw': 'python',
+    # JavaScript/TypeScript
+    '.js': 'javascript',
+    '.mjs': 'javascript',
+    '.cjs': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+    '.jsx': 'javascript',
+    # Java/JVM
+    '.java': 'java',
+    '.scala': 'scala',
+    '.kt': 'kotlin',
+    '.kts': 'kotlin',
+    '.groovy': 'groovy',
+    # C/C++
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.cc': 'cpp',
+    '.cxx': 'cpp',
+    '.h': 'c',
+    '.hpp': 'cpp',
+    '.hxx': 'cpp',
+    # C#/.NET
+    '.cs': 'csharp',
+    '.vb': 'vbnet',
+    '.fs': 'fsharp',
+    # Go
+    '.go': 'go',
+    # Rust
+    '.rs': 'rust',
+    # Ruby
+    '.rb': 'ruby',
+    '.rake': 'ruby',
+    # PHP
+    '.php': 'php',
+    # Swift/Objective-C
+    '.swift': 'swift',
+    '.m': 'objective-c',
+    '.mm': 'objective-c',
+    # SQL variants
+    '.sql': 'sql',
+    '.psql': 'sql',
+    '.plsql': 'sql',
+    '.mysql': 'sql',
+    '.pgsql': 'sql',
+    # Shell
+    '.sh': 'shell',
+    '.bash': 'shell',
+    '.zsh': 'shell',
+    # Other languages
+    '.r': 'r',
+    '.R': 'r',
+    '.pl': 'perl',
+    '.lua': 'lua',
+    '.dart': 'dart',
+    '.ex': 'elixir',
+    '.exs': 'elixir',
+    '.erl': 'erlang',
+    # Web
+    '.vue': 'vue',
+    '.svelte': 'svelte',
+    '.html': 'html',
+    '.css': 'css',
+    '.scss': 'scss',
+    '.sass': 'sass',
+    '.less': 'less',
+}
+
+
 def detect_language(file_path: Path) -> str:
     """Detect programming language from file extension"""
-    ext_map = {
-        # Python
-        '.py': 'python',
-        '.pyx': 'python',
-        '.pyw': 'python',
-        # JavaScript/TypeScript
-        '.js': 'javascript',
-        '.mjs': 'javascript',
-        '.cjs': 'javascript',
-        '.ts': 'typescript',
-        '.tsx': 'typescript',
-        '.jsx': 'javascript',
-        # Java/JVM
-        '.java': 'java',
-        '.scala': 'scala',
-        '.kt': 'kotlin',
-        '.kts': 'kotlin',
-        '.groovy': 'groovy',
-        # C/C++
-        '.c': 'c',
-        '.cpp': 'cpp',
-        '.cc': 'cpp',
-        '.cxx': 'cpp',
-        '.h': 'c',
-        '.hpp': 'cpp',
-        '.hxx': 'cpp',
-        # C#/.NET
-        '.cs': 'csharp',
-        '.vb': 'vbnet',
-        '.fs': 'fsharp',
-        # Go
-        '.go': 'go',
-        # Rust
-        '.rs': 'rust',
-        # Ruby
-        '.rb': 'ruby',
-        '.rake': 'ruby',
-        # PHP
-        '.php': 'php',
-        # Swift/Objective-C
-        '.swift': 'swift',
-        '.m': 'objective-c',
-        '.mm': 'objective-c',
-        # SQL variants
-        '.sql': 'sql',
-        '.psql': 'sql',
-        '.plsql': 'sql',
-        '.mysql': 'sql',
-        '.pgsql': 'sql',
-        # Shell
-        '.sh': 'shell',
-        '.bash': 'shell',
-        '.zsh': 'shell',
-        # Other languages
-        '.r': 'r',
-        '.R': 'r',
-        '.pl': 'perl',
-        '.lua': 'lua',
-        '.dart': 'dart',
-        '.ex': 'elixir',
-        '.exs': 'elixir',
-        '.erl': 'erlang',
-        # Web
-        '.vue': 'vue',
-        '.svelte': 'svelte',
-        '.html': 'html',
-        '.css': 'css',
-        '.scss': 'scss',
-        '.sass': 'sass',
-        '.less': 'less',
-    }
-    return ext_map.get(file_path.suffix.lower(), 'unknown')
+    return _EXT_MAP.get(file_path.suffix.lower(), 'unknown')
+
 
+def compile_scope_filters(scope_filters: list):
+    """Compile glob scope filters into a single union regex.
 
-def matches_scope_filters(file_path: Path, scope_filters: list, base_path: Path) -> bool:
-    """Check if file matches scope filter patterns"""
+    fnmatch.fnmatch re-derives its regex on every call, so matching N files
+    against P patterns recompiled P regexes per file. Compiling the union
+    once per analysis makes the per-file check a single C-level match.
+    """
     if not scope_filters:
-        return True
+        return None
+    return re.compile("|".join(fnmatch.translate(p) for p in scope_filters))
+
+
+def matches_scope_filters(relative_path: str, scope_regex) -> bool:
+    """Check if a repo-relative path matches the precompiled scope regex"""
+    return scope_regex is None or scope_regex.match(relative_path) is not None
+
+
+def _sparse_clone_dirs(scope_filters):
+    """
+    Derive concrete directory prefixes from scope filter patterns.
+
+    "src/**/*.py" yields "src"; a trailing filename component is dropped.
+    Returns None when any pattern has no literal directory prefix (e.g.
+    "*.py"), since sparse checkout can't narrow those.
+    """
+    dirs = set()
+    for pattern in scope_filters or []:
+        parts = []
+        for part in pattern.split('/'):
+            if any(ch in part for ch in '*?['):
+                break
+            parts.append(part)
+        # Drop a trailing filename component - cone mode wants directories
+        if parts and '.' in parts[-1]:
+            parts.pop()
+        if not parts:
+            return None
+        dirs.add('/'.join(parts))
+    return sorted(dirs) if dirs else None
+
+
+async def _run_git(args, timeout: int = 300):
+    """
+    Run a git command without blocking the event loop.
+
+    Returns (returncode, stderr). Clone I/O runs as an async subprocess so
+    multi-repo callers can overlap network transfer with analyzer CPU.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        raise
+    return proc.returncode, stderr.decode(errors='ignore')
+
+
+async def _partial_clone(repo_url: str, git_ref: str, temp_dir: str, scope_dirs) -> bool:
+    """
+    Partial clone (--filter=blob:none) plus sparse checkout of scoped dirs.
+
+    Only blobs under scope_dirs are downloaded at checkout; blobs outside
+    the scope stay on the server and are fetched on demand if ever touched.
+    Returns False on any failure so the caller can fall back to a plain
+    shallow clone.
+    """
+    clone = ["git", "clone", "--filter=blob:none", "--no-checkout", "--depth", "1"]
+
+    returncode, _ = await _run_git(clone + ["--branch", git_ref, repo_url, temp_dir])
+    if returncode != 0:
+        # If branch doesn't exist, try without branch
+        returncode, _ = await _run_git(clone + [repo_url, temp_dir])
+        if returncode != 0:
+            return False
+
+    for args in (
+        ["git", "-C", temp_dir, "sparse-checkout", "init", "--cone"],
+        ["git", "-C", temp_dir, "sparse-checkout", "set"] + list(scope_dirs),
+        ["git", "-C", temp_dir, "checkout"],
+    ):
+        returncode, _ = await _run_git(args)
+        if returncode != 0:
+            return False
+
+    return True
+
+
+def _walk_files(path: str, exclude_patterns):
+    """
+    Recursively yield (path, stat_result) for files under `path` via os.scandir.
+
+    Excluded directories are pruned at the directory level, so the walk never
+    descends into .git/node_modules at all; DirEntry is_file/stat results come
+    cached from the directory listing, avoiding per-file stat syscalls.
+    """
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        return
+
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in exclude_patterns:
+                        yield from _walk_files(entry.path, exclude_patterns)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.stat()
+            except OSError:
+                # Entry vanished or is unreadable - skip it
+                continue
+
+
+def _archive_extract(temp_dir: str, git_ref: str = "HEAD") -> bool:
+    """
+    Materialize a ref's tree with `git archive | tarfile` instead of checkout.
+
+    A checkout writes the index, reflog and per-file metadata; archive streams
+    just the snapshot. Returns False on failure so the caller can fall back
+    to a plain `git checkout`.
+    """
+    try:
+        proc = subprocess.Popen(
+            ["git", "-C", temp_dir, "archive", "--format=tar", git_ref],
+            stdout=subprocess.PIPE
+        )
+        with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+            tar.extractall(temp_dir)
+        return proc.wait(timeout=300) == 0
+    except Exception:
+        return False
+
+
+def _list_tracked_files(base_path: Path, scope_dirs=None):
+    """
+    Enumerate tracked files of a cloned repo via `git ls-tree -r -l HEAD`.
+
+    Yields (absolute_path, size, sha) straight from git's object database -
+    no per-entry syscalls and no VCS/build artifacts to filter out. On a
+    partial clone, pass the sparse-checkout dirs: `-l` needs blob sizes, and
+    an unscoped listing would lazily fetch every out-of-scope blob one by
+    one just to print them. Returns None if git fails so the caller can
+    fall back to walking the tree.
+    """
+    cmd = ["git", "-C", str(base_path), "ls-tree", "-r", "-l", "HEAD"]
+    if scope_dirs:
+        cmd += ["--", *scope_dirs]
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    if result.returncode != 0:
+        return None
+
+    entries = []
+    for line in result.stdout.splitlines():
+        # Format: <mode> <type> <sha> <size>\t<path>
+        meta, _, rel_path = line.partition('\t')
+        parts = meta.split()
+        if len(parts) < 4 or parts[1] != 'blob' or not parts[3].isdigit():
+            continue
+        entries.append((os.path.join(str(base_path), rel_path), int(parts[3]), parts[2]))
+
+    return entries
+
+
+def _batch_read_blobs(base_path: Path, candidates):
+    """
+    Read blob contents through a single `git cat-file --batch` pipe.
+
+    One persistent child process replaces an open/read/close syscall trio
+    per file and lets git stream straight out of its packfiles. Each
+    candidate is (path, language, sha); returns file records in the same
+    shape as _read_one_file, skipping binary blobs, capped at 500 files.
+    """
+    records = []
+
+    proc = subprocess.Popen(
+        ["git", "-C", str(base_path), "cat-file", "--batch"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE
+    )
+
+    try:
+        for file_path, language, sha in candidates:
+            proc.stdin.write(sha.encode() + b"\n")
+            proc.stdin.flush()
+
+            # Header: <sha> <type> <size>, or "<sha> missing"
+            header = proc.stdout.readline().split()
+            if len(header) < 3 or header[1] != b"blob":
+                continue
+
+            size = int(header[2])
+            raw = proc.stdout.read(size)
+            proc.stdout.read(1)  # trailing newline
+
+            # Same binary sniff as _read_one_file
+            if b'\x00' in raw[:8192]:
+                continue
+
+            records.append({
+                "path": str(file_path.relative_to(base_path)),
+                "type": "file",
+                "language": language,
+                "content_gz": zlib.compress(raw, 1),
+                "size": len(raw)
+            })
+
+            # Limit total files to avoid memory issues
+            if len(records) >= 500:
+                break
+    finally:
+        proc.stdin.close()
+        proc.stdout.close()
+        proc.wait(timeout=30)
+
+    return records
+
+
+def _read_one_file(file_path: Path, base_path: Path, language: str):
+    """Read one candidate file (thread-pool worker).
+
+    Returns the file record, or None for binary/unreadable files.
+    """
+    try:
+        raw = file_path.read_bytes()
 
-    relative_path = str(file_path.relative_to(base_path))
+        # Cheap binary sniff: a NUL in the first 8KB means this isn't text
+        # (wasm, images, compiled outputs) - skip before paying for decode
+        if b'\x00' in raw[:8192]:
+            return None
 
-    for pattern in scope_filters:
-        if fnmatch.fnmatch(relative_path, pattern):
-            return True
-    return False
+        # Store contents compressed (level 1 = speed over ratio): up to 500
+        # files ride along in AgentState through every node transition, so
+        # keeping them as plain strings multiplies peak memory. The static
+        # analyzer decompresses each file right before parsing it.
+        return {
+            "path": str(file_path.relative_to(base_path)),
+            "type": "file",
+            "language": language,
+            "content_gz": zlib.compress(raw, 1),
+            "size": len(raw)
+        }
+    except Exception:
+        # Skip files that can't be read
+        return None
 
 
-def repo_reader_node(state: AgentState) -> AgentState:
+async def repo_reader_node(state: AgentState) -> AgentState:
     """
     Fetches the Git repository and builds the file tree.
 
     Real implementation that:
-    1. Clones Git repositories or reads local paths
+    1. Clones Git repositories (async subprocess, so clone I/O can overlap
+       other work) or reads local paths
     2. Applies scope filters
     3. Detects languages
     4. Reads file contents
@@ -181,6 +598,7 @@ def repo_reader_node(state: AgentState) -> AgentState:
         repo_path = state["repo_path"]
         git_ref = state.get("git_ref", "HEAD")
         scope_filters = state.get("scope_filters", [])
+        scope_regex = compile_scope_filters(scope_filters)
         depth = state.get("depth", -1)
 
         # Determine if it's a URL or local path
@@ -196,27 +614,44 @@ def repo_reader_node(state: AgentState) -> AgentState:
             temp_dir = tempfile.mkdtemp(prefix="cortex_repo_")
 
             try:
-                result = subprocess.run(
-                    ["git", "clone", "--depth", "1", "--branch", git_ref, repo_path, temp_dir],
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
-
-                if result.returncode != 0:
-                    # If branch doesn't exist, try without branch
-                    result = subprocess.run(
-                        ["git", "clone", "--depth", "1", repo_path, temp_dir],
-                        capture_output=True,
-                        text=True,
-                        timeout=300
+                # Scoped analysis: partial clone downloads commits/trees only,
+                # then sparse checkout materializes just the filtered dirs -
+                # blobs outside the scope never leave the server
+                scope_dirs = _sparse_clone_dirs(scope_filters)
+                cloned = False
+                if scope_dirs:
+                    cloned = await _partial_clone(repo_path, git_ref, temp_dir, scope_dirs)
+                    if not cloned:
+                        # Start over with a clean directory for the fallback
+                        shutil.rmtree(temp_dir, ignore_errors=True)
+                        os.makedirs(temp_dir, exist_ok=True)
+
+                if not cloned:
+                    # Clone without checkout, then stream the snapshot out of
+                    # the object DB with git archive - skips the index/reflog
+                    # write amplification of a full checkout
+                    returncode, stderr = await _run_git(
+                        ["git", "clone", "--depth", "1", "--no-checkout",
+                         "--branch", git_ref, repo_path, temp_dir],
+                        timeout=300  # 5 minute timeout
                     )
 
-                    if result.returncode != 0:
-                        raise Exception(f"Git clone failed: {result.stderr}")
+                    if returncode != 0:
+                        # If branch doesn't exist, try without branch
+                        returncode, stderr = await _run_git(
+                            ["git", "clone", "--depth", "1", "--no-checkout", repo_path, temp_dir],
+                            timeout=300
+                        )
+
+                        if returncode != 0:
+                            raise Exception(f"Git clone failed: {stderr}")
+
+                    # Blocking pipe read - push it off the event loop
+                    if not await asyncio.to_thread(_archive_extract, temp_dir):
+                        await _run_git(["git", "-C", temp_dir, "checkout"])
 
                 base_path = Path(temp_dir)
-            except subprocess.TimeoutExpired:
+            except (subprocess.TimeoutExpired, asyncio.TimeoutError):
                 raise Exception("Repository clone timed out (>5 minutes)")
         else:
             # Local path
@@ -224,59 +659,95 @@ def repo_reader_node(state: AgentState) -> AgentState:
             if not base_path.exists():
                 raise Exception(f"Local path does not exist: {repo_path}")
 
-        # Walk directory and collect files
-        files = []
-        languages = set()
-
         # Patterns to exclude (common non-code directories)
         exclude_patterns = {
             '.git', 'node_modules', '__pycache__', '.venv', 'venv',
             'dist', 'build', '.next', '.cache', 'coverage', '.pytest_cache'
         }
 
-        for file_path in base_path.rglob("*"):
-            # Skip directories and excluded paths
-            if not file_path.is_file():
+        # Phase 1: collect candidates with cheap filters only. Cloned repos
+        # are enumerated straight from git's object database; local paths use
+        # the scandir walker, which prunes excluded directories up front so
+        # we never descend into .git/node_modules and the stat is free.
+        entries = (
+            _list_tracked_files(base_path, scope_dirs if cloned else None)
+            if temp_dir else None
+        )
+        if entries is None:
+            entries = (
+                (entry_path, entry_stat.st_size, None)
+                for entry_path, entry_stat in _walk_files(str(base_path), exclude_patterns)
+            )
+
+        candidates = []
+        base_prefix = len(str(base_path).rstrip(os.sep)) + 1
+        for entry_path, size, sha in entries:
+            # Skip files larger than 1MB
+            if size > 1024 * 1024:
                 continue
 
-            # Skip if any parent directory matches exclude patterns
-            if any(part in exclude_patterns for part in file_path.parts):
+            file_path = Path(entry_path)
+
+            # Detect language first - a suffix lookup is cheaper than the
+            # scope regex, and both run before any content is read
+            language = detect_language(file_path)
+            if language == 'unknown':
                 continue
 
-            # Check scope filters
-            if not matches_scope_filters(file_path, scope_filters, base_path):
+            # Repo-relative path, computed once by slicing off the base
+            # prefix (Path.relative_to walks every parent component per call)
+            rel_path = entry_path[base_prefix:]
+
+            # ls-tree enumerates everything committed, so repos that check
+            # in node_modules/vendor/dist need the directory filter applied
+            # here; the walker already prunes those directories up front
+            if sha is not None and not exclude_patterns.isdisjoint(rel_path.split('/')[:-1]):
                 continue
 
-            # Detect language
-            language = detect_language(file_path)
-            if language == 'unknown':
+            # Check scope filters against the repo-relative path
+            if not matches_scope_filters(rel_path, scope_regex):
                 continue
 
-            # Read file content (with size limit)
+            candidates.append((file_path, language, sha))
+
+        # Phase 2: fetch contents. Cloned repos stream every blob through a
+        # single `git cat-file --batch` pipe; local paths read concurrently
+        # with a thread pool, since Python releases the GIL around
+        # read/stat syscalls.
+        files = None
+        languages = set()
+
+        if candidates and candidates[0][2] is not None:
             try:
-                # Skip files larger than 1MB
-                if file_path.stat().st_size > 1024 * 1024:
-                    continue
+                files = _batch_read_blobs(base_path, candidates)
+            except Exception:
+                files = None  # Fall back to reading the working tree
 
-                content = file_path.read_text(errors='ignore')
+        if files is not None:
+            languages.update(record["language"] for record in files)
+        else:
+            files = []
 
-                files.append({
-                    "path": str(file_path.relative_to(base_path)),
-                    "type": "file",
-                    "language": language,
-                    "content": content,
-                    "size": len(content)
-                })
+            if candidates:
+                with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4)) as pool:
+                    futures = [
+                        pool.submit(_read_one_file, file_path, base_path, language)
+                        for file_path, language, _sha in candidates
+                    ]
 
-                languages.add(language)
+                    for future in as_completed(futures):
+                        record = future.result()
+                        if record is None:
+                            continue
 
-                # Limit total files to avoid memory issues
-                if len(files) >= 500:
-                    break
+                        files.append(record)
+                        languages.add(record["language"])
 
-            except Exception as e:
-                # Skip files that can't be read
-                continue
+                        # Limit total files to avoid memory issues
+                        if len(files) >= 500:
+                            for pending in futures:
+                                pending.cancel()
+                            break
 
         file_tree = {
             "root": repo_path,
@@ -291,7 +762,6 @@ def repo_reader_node(state: AgentState) -> AgentState:
         }
 
         return {
-            **state,
             "file_tree": file_tree,
             "messages": [f"✓ Repo Reader: Fetched {len(files)} files from {git_ref} ({', '.join(languages)})"]
         }
@@ -302,7 +772,6 @@ def repo_reader_node(state: AgentState) -> AgentState:
             shutil.rmtree(temp_dir, ignore_errors=True)
 
         return {
-            **state,
             "file_tree": {},
             "errors": [f"Repo Reader failed: {str(e)}"],
             "messages": [f"✗ Repo Reader: {str(e)}"]
@@ -313,279 +782,330 @@ def repo_reader_node(state: AgentState) -> AgentState:
 # COMPONENT 2: STATIC ANALYZER (S)
 # ============================================================================
 
-def analyze_python_file(content: str, file_path: str):
-    """Parse Python file using AST - Enhanced with call graph extraction"""
-    symbols = []
-    imports = []
-    function_calls = []
-    class_relationships = []
-
-    try:
-        tree = ast.parse(content)
+class _PyExtractor(ast.NodeVisitor):
+    """
+    Single-pass AST visitor extracting symbols, imports, calls and inheritance.
 
-        # Track current context (class/function we're in)
-        current_class = None
-        current_function = None
-
-        for node in ast.walk(tree):
-            # Extract class definitions and inheritance
-            if isinstance(node, ast.ClassDef):
-                # Get base classes
-                bases = [base.id if isinstance(base, ast.Name) else str(base) for base in node.bases]
-
-                symbols.append({
-                    "name": node.name,
-                    "type": "class",
-                    "file": file_path,
-                    "line": node.lineno,
-                    "bases": bases  # Inheritance info
-                })
+    Maintains explicit class/function context stacks, replacing the previous
+    double ast.walk (whole tree, then again per function) which visited every
+    node inside functions twice and never reset the current class after
+    leaving its body - misattributing later top-level functions.
+    """
 
-                # Record inheritance relationships
-                for base in bases:
-                    class_relationships.append({
-                        "from_class": node.name,
-                        "to_class": base,
-                        "type": "inherits",
-                        "file": file_path
-                    })
-
-                current_class = node.name
-
-                # Extract methods within the class
-                for item in node.body:
-                    if isinstance(item, ast.FunctionDef):
-                        symbols.append({
-                            "name": item.name,
-                            "type": "method",
-                            "class": current_class,
-                            "file": file_path,
-                            "line": item.lineno
-                        })
-
-            # Extract function definitions
-            elif isinstance(node, ast.FunctionDef):
-                # Check if it's a top-level function (not a method)
-                if current_class is None:
-                    symbols.append({
-                        "name": node.name,
-                        "type": "function",
-                        "file": file_path,
-                        "line": node.lineno
-                    })
-
-                current_function = node.name
-
-                # Extract function calls within this function
-                for subnode in ast.walk(node):
-                    if isinstance(subnode, ast.Call):
-                        # Get the called function name
-                        if isinstance(subnode.func, ast.Name):
-                            called_name = subnode.func.id
-                        elif isinstance(subnode.func, ast.Attribute):
-                            # Method call like obj.method()
-                            called_name = subnode.func.attr
-                        else:
-                            continue
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.class_stack = []
+        self.func_stack = []
+        self.symbols = []
+        self.imports = []
+        self.function_calls = []
+        self.class_relationships = []
+
+    def visit_ClassDef(self, node):
+        # Get base classes
+        bases = [base.id if isinstance(base, ast.Name) else str(base) for base in node.bases]
+
+        self.symbols.append(Symbol(
+            name=node.name,
+            type="class",
+            file=self.file_path,
+            line=node.lineno,
+            end_line=node.end_lineno,  # Positions come free from the AST
+            col=node.col_offset,
+            bases=bases  # Inheritance info
+        ))
+
+        # Record inheritance relationships
+        for base in bases:
+            self.class_relationships.append(Relation(
+                from_class=node.name,
+                to_class=base,
+                type="inherits",
+                file=self.file_path
+            ))
+
+        self.class_stack.append(node.name)
+        self.generic_visit(node)
+        self.class_stack.pop()
+
+    def visit_FunctionDef(self, node):
+        self.symbols.append(Symbol(
+            name=node.name,
+            type="method" if self.class_stack else "function",
+            class_=self.class_stack[-1] if self.class_stack else None,
+            file=self.file_path,
+            line=node.lineno,
+            end_line=node.end_lineno,
+            col=node.col_offset
+        ))
+
+        self.func_stack.append(node.name)
+        self.generic_visit(node)
+        self.func_stack.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node):
+        if self.func_stack:
+            # Get the called function name
+            if isinstance(node.func, ast.Name):
+                called_name = node.func.id
+            elif isinstance(node.func, ast.Attribute):
+                # Method call like obj.method()
+                called_name = node.func.attr
+            else:
+                called_name = None
+
+            if called_name:
+                self.function_calls.append(Call(
+                    from_function=self.func_stack[-1],
+                    from_class=self.class_stack[-1] if self.class_stack else None,
+                    to_function=called_name,
+                    file=self.file_path,
+                    line=node.lineno
+                ))
+
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports.append(Import(
+                from_file=self.file_path,
+                module=alias.name,
+                symbol=alias.asname or alias.name
+            ))
+
+    def visit_ImportFrom(self, node):
+        module = node.module or ""
+        for alias in node.names:
+            self.imports.append(Import(
+                from_file=self.file_path,
+                module=module,
+                symbol=alias.name
+            ))
 
-                        function_calls.append({
-                            "from_function": current_function,
-                            "from_class": current_class,
-                            "to_function": called_name,
-                            "file": file_path,
-                            "line": subnode.lineno
-                        })
-
-            # Extract imports
-            elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        imports.append({
-                            "from": file_path,
-                            "module": alias.name,
-                            "symbol": alias.asname or alias.name
-                        })
-                elif isinstance(node, ast.ImportFrom):
-                    module = node.module or ""
-                    for alias in node.names:
-                        imports.append({
-                            "from": file_path,
-                            "module": module,
-                            "symbol": alias.name
-                        })
 
+def analyze_python_file(content: str, file_path: str):
+    """Parse Python file using AST - single-visitor extraction with call graph"""
+    try:
+        tree = ast.parse(content)
     except SyntaxError:
-        pass  # Skip files with syntax errors
-
-    return symbols, imports, function_calls, class_relationships
+        # Skip files with syntax errors
+        return [], [], [], []
+
+    extractor = _PyExtractor(file_path)
+    extractor.visit(tree)
+    return (extractor.symbols, extractor.imports,
+            extractor.function_calls, extractor.class_relationships)
+
+
+# Compiled once at import - the regex analyzers run these over hundreds of
+# files, so avoid the per-call cache lookup (and the capped re cache).
+# The JS and generic patterns are unioned into one alternation so each file
+# is scanned in a single pass; dispatch is on which named group matched.
+_JS_ALL_RE = re.compile(
+    r'class\s+(?P<cls>[A-Z]\w*)(?:\s+extends\s+(?P<base>[A-Z]\w*))?'
+    r'|function\s+(?P<fn>\w+)'
+    r'|const\s+(?P<cfn>\w+)\s*=\s*(?:async\s*)?\('
+    r'|import\s+(?:{[^}]*}|\w+|[^from]*)\s+from\s+["\'](?P<imp>[^"\']+)["\']'
+    r'|require\(["\'](?P<req>[^"\']+)["\']\)'
+)
+
+_SQL_TABLE_RE = re.compile(
+    r'CREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([a-zA-Z_][\w\.]*)',
+    re.IGNORECASE)
+_SQL_VIEW_RE = re.compile(r'CREATE\s+(?:OR\s+REPLACE\s+)?VIEW\s+([a-zA-Z_][\w\.]*)', re.IGNORECASE)
+_SQL_PROC_RE = re.compile(
+    r'CREATE\s+(?:OR\s+REPLACE\s+)?(?:PROCEDURE|FUNCTION)\s+([a-zA-Z_][\w\.]*)',
+    re.IGNORECASE)
+_SQL_FROM_RE = re.compile(r'(?:FROM|JOIN)\s+([a-zA-Z_][\w\.]*)', re.IGNORECASE)
+
+_GENERIC_ALL_RE = re.compile(
+    r'(?:public|private|protected|static|async|func|def|fn)\s+(?P<fn>[a-zA-Z_]\w*)\s*\('
+    r'|(?:class|struct|interface|trait)\s+(?P<cls>[A-Z][a-zA-Z0-9_]*)'
+    r'|(?:import|use|require|include|#include)\s+(?:["<](?P<imp>[^">]+)[">]|(?P<mod>[a-zA-Z_][\w\.:]*))'
+)
+
+
+def _line_index(content: str):
+    """Newline offsets of `content`, computed in one pass for _line_at"""
+    starts = []
+    pos = content.find('\n')
+    while pos != -1:
+        starts.append(pos)
+        pos = content.find('\n', pos + 1)
+    return starts
+
+
+def _line_at(line_starts, offset: int) -> int:
+    """1-based line number of a character offset, via binary search"""
+    return bisect.bisect_right(line_starts, offset) + 1
 
 
 def analyze_javascript_file(content: str, file_path: str):
     """Parse JavaScript/TypeScript file using regex - Enhanced with calls"""
+    line_starts = _line_index(content)
     symbols = []
     imports = []
     function_calls = []  # Simplified call detection for JS
     class_relationships = []
 
-    # Match class declarations with extends: class ClassName extends BaseClass
-    class_pattern = r'class\s+([A-Z]\w*)(?:\s+extends\s+([A-Z]\w*))?'
-    for match in re.finditer(class_pattern, content):
-        class_name = match.group(1)
-        base_class = match.group(2)
-
-        symbols.append({
-            "name": class_name,
-            "type": "class",
-            "file": file_path,
-            "line": content[:match.start()].count('\n') + 1,
-            "bases": [base_class] if base_class else []
-        })
-
-        # Record inheritance
-        if base_class:
-            class_relationships.append({
-                "from_class": class_name,
-                "to_class": base_class,
-                "type": "inherits",
-                "file": file_path
-            })
-
-    # Match function declarations: function funcName, const funcName = () =>
-    func_pattern = r'(?:function\s+(\w+)|const\s+(\w+)\s*=\s*(?:async\s*)?\()'
-    for match in re.finditer(func_pattern, content):
-        name = match.group(1) or match.group(2)
+    # Single pass over the content; the union regex matches class/function
+    # declarations, imports and requires, dispatched on the matched group
+    for match in _JS_ALL_RE.finditer(content):
+        class_name = match.group('cls')
+        if class_name:
+            base_class = match.group('base')
+
+            symbols.append(Symbol(
+                name=class_name,
+                type="class",
+                file=file_path,
+                line=_line_at(line_starts, match.start()),
+                bases=[base_class] if base_class else []
+            ))
+
+            # Record inheritance
+            if base_class:
+                class_relationships.append(Relation(
+                    from_class=class_name,
+                    to_class=base_class,
+                    type="inherits",
+                    file=file_path
+                ))
+            continue
+
+        # function funcName, const funcName = () =>
+        name = match.group('fn') or match.group('cfn')
         if name:
-            symbols.append({
-                "name": name,
-                "type": "function",
-                "file": file_path,
-                "line": content[:match.start()].count('\n') + 1
-            })
-
-    # Match imports: import ... from '...'
-    import_pattern = r'import\s+(?:{[^}]*}|\w+|[^from]*)\s+from\s+["\']([^"\']+)["\']'
-    for match in re.finditer(import_pattern, content):
-        imports.append({
-            "from": file_path,
-            "module": match.group(1),
-            "symbol": "*"
-        })
-
-    # Match require: const x = require('...')
-    require_pattern = r'require\(["\']([^"\']+)["\']\)'
-    for match in re.finditer(require_pattern, content):
-        imports.append({
-            "from": file_path,
-            "module": match.group(1),
-            "symbol": "*"
-        })
+            symbols.append(Symbol(
+                name=name,
+                type="function",
+                file=file_path,
+                line=_line_at(line_starts, match.start())
+            ))
+            continue
+
+        # import ... from '...', const x = require('...')
+        module = match.group('imp') or match.group('req')
+        if module:
+            imports.append(Import(from_file=file_path, module=module, symbol="*"))
 
     return symbols, imports, function_calls, class_relationships
 
 
 def analyze_sql_file(content: str, file_path: str):
     """Parse SQL file using regex to extract tables, views, procedures, functions"""
+    line_starts = _line_index(content)
     symbols = []
     imports = []
     function_calls = []
     class_relationships = []
 
     # Match CREATE TABLE
-    table_pattern = r'CREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([a-zA-Z_][\w\.]*)'
-    for match in re.finditer(table_pattern, content, re.IGNORECASE):
-        table_name = match.group(1)
-        symbols.append({
-            "name": table_name,
-            "type": "table",
-            "file": file_path,
-            "line": content[:match.start()].count('\n') + 1
-        })
+    for match in _SQL_TABLE_RE.finditer(content):
+        symbols.append(Symbol(
+            name=match.group(1),
+            type="table",
+            file=file_path,
+            line=_line_at(line_starts, match.start())
+        ))
 
     # Match CREATE VIEW
-    view_pattern = r'CREATE\s+(?:OR\s+REPLACE\s+)?VIEW\s+([a-zA-Z_][\w\.]*)'
-    for match in re.finditer(view_pattern, content, re.IGNORECASE):
-        view_name = match.group(1)
-        symbols.append({
-            "name": view_name,
-            "type": "view",
-            "file": file_path,
-            "line": content[:match.start()].count('\n') + 1
-        })
+    for match in _SQL_VIEW_RE.finditer(content):
+        symbols.append(Symbol(
+            name=match.group(1),
+            type="view",
+            file=file_path,
+            line=_line_at(line_starts, match.start())
+        ))
 
     # Match CREATE PROCEDURE/FUNCTION
-    proc_pattern = r'CREATE\s+(?:OR\s+REPLACE\s+)?(?:PROCEDURE|FUNCTION)\s+([a-zA-Z_][\w\.]*)'
-    for match in re.finditer(proc_pattern, content, re.IGNORECASE):
-        proc_name = match.group(1)
-        symbols.append({
-            "name": proc_name,
-            "type": "procedure",
-            "file": file_path,
-            "line": content[:match.start()].count('\n') + 1
-        })
+    for match in _SQL_PROC_RE.finditer(content):
+        symbols.append(Symbol(
+            name=match.group(1),
+            type="procedure",
+            file=file_path,
+            line=_line_at(line_starts, match.start())
+        ))
 
     # Match table references in FROM/JOIN clauses
-    from_pattern = r'(?:FROM|JOIN)\s+([a-zA-Z_][\w\.]*)'
     referenced_tables = set()
-    for match in re.finditer(from_pattern, content, re.IGNORECASE):
+    for match in _SQL_FROM_RE.finditer(content):
         referenced_tables.add(match.group(1))
 
     # Create imports for referenced tables
     for table in referenced_tables:
-        imports.append({
-            "from": file_path,
-            "module": table,
-            "symbol": table
-        })
+        imports.append(Import(from_file=file_path, module=table, symbol=table))
 
     return symbols, imports, function_calls, class_relationships
 
 
 def analyze_generic_file(content: str, file_path: str, language: str):
     """Generic parser for languages without specific support - extracts basic structure"""
+    line_starts = _line_index(content)
     symbols = []
     imports = []
     function_calls = []
     class_relationships = []
 
-    # Generic function/method pattern (works for many C-like languages)
-    # Matches: public/private/protected function_name(...) or def function_name(...)
-    func_pattern = r'(?:public|private|protected|static|async|func|def|fn)\s+([a-zA-Z_]\w*)\s*\('
-    for match in re.finditer(func_pattern, content):
-        name = match.group(1)
-        if name and not name.startswith('_'):  # Skip private/special names
-            symbols.append({
-                "name": name,
-                "type": "function",
-                "file": file_path,
-                "line": content[:match.start()].count('\n') + 1
-            })
-
-    # Generic class pattern
-    class_pattern = r'(?:class|struct|interface|trait)\s+([A-Z][a-zA-Z0-9_]*)'
-    for match in re.finditer(class_pattern, content):
-        name = match.group(1)
-        symbols.append({
-            "name": name,
-            "type": "class",
-            "file": file_path,
-            "line": content[:match.start()].count('\n') + 1,
-            "bases": []
-        })
-
-    # Generic import patterns (import, use, require, include)
-    import_pattern = r'(?:import|use|require|include|#include)\s+(?:["<]([^">]+)[">]|([a-zA-Z_][\w\.:]*))'
-    for match in re.finditer(import_pattern, content):
-        module = match.group(1) or match.group(2)
+    # Single pass with the union regex: functions/methods (many C-like
+    # languages), class-like declarations, and import/use/include statements
+    for match in _GENERIC_ALL_RE.finditer(content):
+        name = match.group('fn')
+        if name:
+            if not name.startswith('_'):  # Skip private/special names
+                symbols.append(Symbol(
+                    name=name,
+                    type="function",
+                    file=file_path,
+                    line=_line_at(line_starts, match.start())
+                ))
+            continue
+
+        name = match.group('cls')
+        if name:
+            symbols.append(Symbol(
+                name=name,
+                type="class",
+                file=file_path,
+                line=_line_at(line_starts, match.start())
+            ))
+            continue
+
+        module = match.group('imp') or match.group('mod')
         if module:
-            imports.append({
-                "from": file_path,
-                "module": module,
-                "symbol": "*"
-            })
+            imports.append(Import(from_file=file_path, module=module, symbol="*"))
 
     return symbols, imports, function_calls, class_relationships
 
 
+def _analyze_one(payload):
+    """
+    Analyze one (content, path, language) tuple - process-pool worker.
+
+    Top-level so it pickles. Returns the (symbols, imports, function_calls,
+    class_relationships) 4-tuple, or None on parse error.
+    """
+    content_gz, file_path, language = payload
+
+    try:
+        # Contents travel compressed (see _read_one_file) - inflate here,
+        # inside the worker, so the pickled payload stays small too
+        content = zlib.decompress(content_gz).decode('utf-8', errors='ignore') if content_gz else ""
+
+        if language == "python":
+            return analyze_python_file(content, file_path)
+        if language in ("javascript", "typescript"):
+            return analyze_javascript_file(content, file_path)
+        if language == "sql":
+            return analyze_sql_file(content, file_path)
+        # Use generic parser for all other languages
+        return analyze_generic_file(content, file_path, language)
+    except Exception:
+        return None
+
+
 def static_analyzer_node(state: AgentState) -> AgentState:
     """
     Parses source code to extract structural facts.
@@ -601,47 +1121,28 @@ def static_analyzer_node(state: AgentState) -> AgentState:
         file_tree = state.get("file_tree", {})
         files = file_tree.get("files", [])
 
-        all_symbols = []
-        all_imports = []
-        all_function_calls = []
-        all_class_relationships = []
-        parse_errors = 0
+        payloads = [
+            (file_info.get("content_gz", b""), file_info["path"], file_info.get("language", ""))
+            for file_info in files
+        ]
 
-        for file_info in files:
-            file_path = file_info["path"]
-            content = file_info.get("content", "")
-            language = file_info.get("language", "")
+        # AST parsing is pure CPU and GIL-bound, so fan the files out across
+        # worker processes; below ~50 files the pool startup costs more than
+        # it saves, so analyze serially there.
+        if len(payloads) >= 50:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+                results = list(ex.map(_analyze_one, payloads, chunksize=8))
+        else:
+            results = list(map(_analyze_one, payloads))
 
-            try:
-                if language == "python":
-                    symbols, imports, func_calls, class_rels = analyze_python_file(content, file_path)
-                    all_symbols.extend(symbols)
-                    all_imports.extend(imports)
-                    all_function_calls.extend(func_calls)
-                    all_class_relationships.extend(class_rels)
-                elif language in ["javascript", "typescript"]:
-                    symbols, imports, func_calls, class_rels = analyze_javascript_file(content, file_path)
-                    all_symbols.extend(symbols)
-                    all_imports.extend(imports)
-                    all_function_calls.extend(func_calls)
-                    all_class_relationships.extend(class_rels)
-                elif language == "sql":
-                    symbols, imports, func_calls, class_rels = analyze_sql_file(content, file_path)
-                    all_symbols.extend(symbols)
-                    all_imports.extend(imports)
-                    all_function_calls.extend(func_calls)
-                    all_class_relationships.extend(class_rels)
-                else:
-                    # Use generic parser for all other languages
-                    symbols, imports, func_calls, class_rels = analyze_generic_file(content, file_path, language)
-                    all_symbols.extend(symbols)
-                    all_imports.extend(imports)
-                    all_function_calls.extend(func_calls)
-                    all_class_relationships.extend(class_rels)
-
-            except Exception as e:
-                parse_errors += 1
-                continue
+        # Merge once with chain.from_iterable rather than 4 extends per file
+        parsed = [result for result in results if result is not None]
+        parse_errors = len(results) - len(parsed)
+
+        all_symbols = list(chain.from_iterable(r[0] for r in parsed))
+        all_imports = list(chain.from_iterable(r[1] for r in parsed))
+        all_function_calls = list(chain.from_iterable(r[2] for r in parsed))
+        all_class_relationships = list(chain.from_iterable(r[3] for r in parsed))
 
         code_facts = {
             "symbols": all_symbols,
@@ -659,14 +1160,12 @@ def static_analyzer_node(state: AgentState) -> AgentState:
         }
 
         return {
-            **state,
             "code_facts": code_facts,
             "messages": [f"✓ Static Analyzer: Extracted {len(all_symbols)} symbols, {len(all_function_calls)} function calls from {len(files)} files"]
         }
 
     except Exception as e:
         return {
-            **state,
             "code_facts": {},
             "errors": [f"Static Analyzer failed: {str(e)}"],
             "messages": [f"✗ Static Analyzer: {str(e)}"]
@@ -677,54 +1176,60 @@ def static_analyzer_node(state: AgentState) -> AgentState:
 # COMPONENT 3: GRAPH BUILDER (G)
 # ============================================================================
 
-def resolve_import_to_file(module_path: str, all_files: set) -> str:
-    """Try to resolve an import module path to an actual file"""
-    # Common patterns for resolving imports
-    candidates = [
-        f"{module_path}.py",
-        f"{module_path}.js",
-        f"{module_path}.ts",
-        f"{module_path}.tsx",
-        f"{module_path}/index.js",
-        f"{module_path}/index.ts",
-    ]
-
-    # Normalize paths
+def _build_file_index(all_files: set) -> dict:
+    """
+    Index files by every resolvable key for O(1) import resolution.
+
+    For each file this records the normalized path, every path suffix
+    ("a/b/c.py", "b/c.py", "c.py") and the extension-less basename, so
+    resolve_import_to_file is a handful of dict probes instead of a scan
+    over all files per import (quadratic on medium codebases).
+    """
+    index = {}
     for file in all_files:
-        normalized = file.replace("\\", "/")
-        for candidate in candidates:
-            if normalized.endswith(candidate) or module_path in normalized:
-                return file
+        parts = file.replace("\\", "/").split("/")
+        for i in range(len(parts)):
+            index.setdefault("/".join(parts[i:]), file)
+        index.setdefault(parts[-1].rsplit(".", 1)[0], file)
+    return index
 
-    return None
 
+# Candidate endings tried against the file index, in priority order
+_RESOLVE_SUFFIXES = ("", ".py", ".js", ".ts", ".tsx", "/index.js", "/index.ts")
 
-def extract_folder_structure(file_paths):
-    """Extract hierarchical folder structure from file paths"""
-    folders = {}
 
-    for file_path in file_paths:
-        parts = file_path.replace("\\", "/").split("/")
+def resolve_import_to_file(module_path: str, file_index: dict) -> str:
+    """Try to resolve an import module path to an actual file"""
+    if not module_path:
+        return None
+
+    # "./utils" -> "utils"; "a.b.c" also gets probed in its path form
+    module_path = module_path.lstrip("./")
+    forms = (module_path, module_path.replace(".", "/")) if "." in module_path else (module_path,)
+
+    for form in forms:
+        for suffix in _RESOLVE_SUFFIXES:
+            target = file_index.get(form + suffix)
+            if target:
+                return target
+
+    return None
 
-        # Get folder path (all parts except the file name)
-        if len(parts) > 1:
-            folder = "/".join(parts[:-1])
-            file_name = parts[-1]
-
-            if folder not in folders:
-                folders[folder] = {
-                    "path": folder,
-                    "files": [],
-                    "depth": len(parts) - 1
-                }
-            folders[folder]["files"].append(file_path)
-        else:
-            # Root level file
-            if "." not in folders:
-                folders["."] = {"path": ".", "files": [], "depth": 0}
-            folders["."]["files"].append(file_path)
 
-    return folders
+def extract_folder_structure(file_info: dict):
+    """Extract hierarchical folder structure from precomputed path info"""
+    grouped = defaultdict(list)
+    for file_path, (_normalized, folder) in file_info.items():
+        grouped[folder].append(file_path)
+
+    return {
+        folder: {
+            "path": folder,
+            "files": files,
+            "depth": 0 if folder == "." else folder.count("/") + 1
+        }
+        for folder, files in grouped.items()
+    }
 
 
 def graph_builder_node(state: AgentState) -> AgentState:
@@ -748,99 +1253,212 @@ def graph_builder_node(state: AgentState) -> AgentState:
         G = nx.DiGraph()
 
         # Get all unique files
-        all_files = {symbol["file"] for symbol in symbols}
-        all_files.update({imp["from"] for imp in imports})
+        all_files = {symbol.file for symbol in symbols}
+        all_files.update(imp.from_file for imp in imports)
+
+        # Normalize each path exactly once: raw -> (normalized, folder).
+        # The same split was previously redone for node metadata, both ends
+        # of every edge, and the folder stats.
+        file_info = {}
+        for file_path in all_files:
+            normalized = file_path.replace("\\", "/")
+            folder = normalized.rsplit("/", 1)[0] if "/" in normalized else "."
+            file_info[file_path] = (normalized, folder)
 
         # Extract folder structure
-        folder_structure = extract_folder_structure(all_files)
+        folder_structure = extract_folder_structure(file_info)
+
+        # One suffix index up front; each import then resolves in O(1)
+        file_index = _build_file_index(all_files)
 
         # Add nodes for each file with folder metadata
         for file_path in all_files:
-            parts = file_path.replace("\\", "/").split("/")
-            folder = "/".join(parts[:-1]) if len(parts) > 1 else "."
-            G.add_node(file_path, type="module", folder=folder)
+            G.add_node(file_path, type="module", folder=file_info[file_path][1])
+
+        # Aggregate edge weights first, then bulk-insert. Per-import
+        # has_edge/add_edge allocated and probed attribute dicts inside the
+        # hot loop; a Counter pass plus one add_edges_from skips all of that.
+        edge_weights = Counter()
+        edge_relationship = {}
+
+        # Drop imports missing a module or source file up front instead of
+        # attempting (and failing) resolution for each one in the loop
+        resolvable = (imp for imp in imports if imp.module and imp.from_file)
+
+        # Many files import the same module, so memoize resolution per unique
+        # module string; the index is call-local, so a plain dict beats
+        # lru_cache here
+        resolve_cache = {}
 
-        # Add edges for imports
-        for imp in imports:
-            source = imp["from"]
-            module = imp.get("module", "")
+        for imp in resolvable:
+            source = imp.from_file
 
             # Try to resolve module to actual file
-            target = resolve_import_to_file(module, all_files)
+            module = imp.module
+            if module in resolve_cache:
+                target = resolve_cache[module]
+            else:
+                target = resolve_cache[module] = resolve_import_to_file(module, file_index)
 
             if target and target != source:
-                # Determine if this is intra-folder or inter-folder
-                source_parts = source.replace("\\", "/").split("/")
-                target_parts = target.replace("\\", "/").split("/")
-                source_folder = "/".join(source_parts[:-1]) if len(source_parts) > 1 else "."
-                target_folder = "/".join(target_parts[:-1]) if len(target_parts) > 1 else "."
-
-                relationship_type = "intra_folder" if source_folder == target_folder else "inter_folder"
+                key = (source, target)
+                edge_weights[key] += 1
+
+                if key not in edge_relationship:
+                    # Determine if this is intra-folder or inter-folder
+                    edge_relationship[key] = (
+                        "intra_folder" if file_info[source][1] == file_info[target][1]
+                        else "inter_folder"
+                    )
 
-                if G.has_edge(source, target):
-                    # Increment weight if edge exists
-                    G[source][target]["weight"] += 1
-                else:
-                    G.add_edge(source, target, type="import", weight=1, relationship=relationship_type)
+        G.add_edges_from(
+            (source, target, {
+                "type": "import",
+                "weight": weight,
+                "relationship": edge_relationship[(source, target)]
+            })
+            for (source, target), weight in edge_weights.items()
+        )
 
         # Calculate metrics
         if G.number_of_nodes() > 0:
-            try:
-                centrality = nx.degree_centrality(G)
-            except:
-                centrality = {node: 0 for node in G.nodes()}
+            centrality = None
+            communities = None
+
+            # Community detection only needs connectivity, so fold the
+            # aggregated directed weights into an undirected Counter instead
+            # of copying the whole graph with G.to_undirected()
+            undirected_weights = Counter()
+            for (source, target), weight in edge_weights.items():
+                key = (source, target) if source <= target else (target, source)
+                undirected_weights[key] += weight
+
+            # Fast path: hand the aggregated edge lists to igraph and run
+            # degree centrality + multilevel community detection in C
+            if _igraph is not None and edge_weights:
+                try:
+                    ig = _igraph.Graph.TupleList(
+                        ((s, t, w) for (s, t), w in edge_weights.items()),
+                        directed=True, weights=True
+                    )
+                    names = ig.vs["name"]
+                    denominator = max(G.number_of_nodes() - 1, 1)
+
+                    # Isolated nodes never reach igraph, so start them at 0
+                    centrality = {node: 0 for node in G.nodes()}
+                    centrality.update(
+                        (name, degree / denominator)
+                        for name, degree in zip(names, ig.degree(mode="all"))
+                    )
 
-            # Detect communities/clusters
-            try:
-                if G.number_of_edges() > 0:
-                    undirected = G.to_undirected()
-                    communities = nx.community.greedy_modularity_communities(undirected)
-                    clusters = [
-                        {"id": f"cluster_{i}", "modules": list(cluster)}
-                        for i, cluster in enumerate(communities)
-                    ]
-                else:
-                    clusters = [{"id": "cluster_0", "modules": list(G.nodes())}]
-            except:
-                clusters = [{"id": "cluster_0", "modules": list(G.nodes())}]
+                    ig_und = _igraph.Graph.TupleList(
+                        ((a, b, w) for (a, b), w in undirected_weights.items()),
+                        directed=False, weights=True
+                    )
+                    und_names = ig_und.vs["name"]
+                    membership = ig_und.community_multilevel(weights="weight")
+                    communities = [[und_names[i] for i in cluster] for cluster in membership]
+
+                    # igraph only ever sees nodes with edges; add isolated
+                    # files as singleton clusters so cluster counts match
+                    # the networkx path, which seeds all of G's nodes
+                    clustered = set(und_names)
+                    communities.extend(
+                        [node] for node in G.nodes() if node not in clustered
+                    )
+                except Exception:
+                    centrality = None
+                    communities = None
 
-            # Analyze folder-level relationships
-            folder_relationships = {}
-            for source, target, data in G.edges(data=True):
-                source_folder = G.nodes[source].get("folder", ".")
-                target_folder = G.nodes[target].get("folder", ".")
+            if centrality is None:
+                try:
+                    centrality = nx.degree_centrality(G)
+                except:
+                    centrality = {node: 0 for node in G.nodes()}
 
-                if source_folder != target_folder:
-                    key = f"{source_folder} -> {target_folder}"
-                    folder_relationships[key] = folder_relationships.get(key, 0) + 1
+            # Detect communities/clusters
+            if communities is None:
+                try:
+                    if G.number_of_edges() > 0:
+                        undirected = nx.Graph()
+                        undirected.add_nodes_from(G.nodes())
+                        undirected.add_weighted_edges_from(
+                            (a, b, w) for (a, b), w in undirected_weights.items()
+                        )
+                        communities = nx.community.greedy_modularity_communities(undirected)
+                    else:
+                        communities = [list(G.nodes())]
+                except:
+                    communities = [list(G.nodes())]
+
+            # Materialize module lists only for the largest communities; on
+            # big monorepos the long tail of tiny clusters dominates the
+            # payload, so it collapses into one summary entry
+            cluster_count = len(communities)
+            ranked_communities = sorted(communities, key=len, reverse=True)
+            clusters = [
+                {"id": f"cluster_{i}", "modules": list(cluster)}
+                for i, cluster in enumerate(ranked_communities[:50])
+            ]
+            if cluster_count > 50:
+                clusters.append({
+                    "id": "other",
+                    "module_count": sum(len(cluster) for cluster in ranked_communities[50:])
+                })
 
-            # Count intra vs inter folder edges
-            intra_folder_edges = sum(1 for _, _, d in G.edges(data=True) if d.get("relationship") == "intra_folder")
-            inter_folder_edges = sum(1 for _, _, d in G.edges(data=True) if d.get("relationship") == "inter_folder")
+            # Analyze folder-level relationships and the intra/inter split in
+            # a single pass over the aggregated edge records; reading the
+            # flat Counter/dict pair avoids walking networkx's dict-of-dicts
+            # adjacency and its per-edge attribute dicts
+            folder_relationships = Counter()
+            intra_folder_edges = 0
+            inter_folder_edges = 0
+
+            for (source, target), relationship in edge_relationship.items():
+                if relationship == "intra_folder":
+                    intra_folder_edges += 1
+                else:
+                    inter_folder_edges += 1
+                    folder_relationships[
+                        (file_info[source][1], file_info[target][1])
+                    ] += 1
 
             # Graph metrics
+            node_count = G.number_of_nodes()
+            edge_count = G.number_of_edges()
             metrics = {
-                "total_nodes": G.number_of_nodes(),
-                "total_edges": G.number_of_edges(),
-                "avg_degree": sum(dict(G.degree()).values()) / G.number_of_nodes() if G.number_of_nodes() > 0 else 0,
-                "density": nx.density(G),
+                "total_nodes": node_count,
+                "total_edges": edge_count,
+                # sum(degrees) == 2 * |E|, so skip materializing the degree dict
+                "avg_degree": (2 * edge_count) / node_count if node_count > 0 else 0,
+                # Directed density, inlined since N and E are already at hand
+                "density": edge_count / (node_count * (node_count - 1)) if node_count > 1 else 0.0,
                 "intra_folder_edges": intra_folder_edges,
                 "inter_folder_edges": inter_folder_edges,
-                "total_folders": len(folder_structure)
+                "total_folders": len(folder_structure),
+                "cluster_count": cluster_count
             }
 
-            # Build output
+            # Build output; degree counts come straight from the aggregated
+            # edge keys (Counter defaults isolated nodes to 0) rather than
+            # networkx degree views
+            in_deg = Counter(target for _, target in edge_weights)
+            out_deg = Counter(source for source, _ in edge_weights)
+
+            # Sort folders once here; the LLM prompt and markdown renderer
+            # consume this ordering downstream instead of re-deriving it
+            sorted_folders = sorted(folder_structure.values(), key=lambda x: x["depth"])
             dependency_graph = {
                 "nodes": [
                     {
                         "id": node,
                         "type": "module",
-                        "folder": G.nodes[node].get("folder", "."),
+                        "folder": attrs.get("folder", "."),
                         "centrality": centrality.get(node, 0),
-                        "in_degree": G.in_degree(node),
-                        "out_degree": G.out_degree(node)
+                        "in_degree": in_deg[node],
+                        "out_degree": out_deg[node]
                     }
-                    for node in G.nodes()
+                    for node, attrs in G.nodes(data=True)
                 ],
                 "edges": [
                     {
@@ -861,11 +1479,12 @@ def graph_builder_node(state: AgentState) -> AgentState:
                         "file_count": len(folder_data["files"]),
                         "depth": folder_data["depth"]
                     }
-                    for folder_data in sorted(folder_structure.values(), key=lambda x: x["depth"])
+                    for folder_data in sorted_folders
                 ],
                 "folder_relationships": [
-                    {"from_to": k, "count": v}
-                    for k, v in sorted(folder_relationships.items(), key=lambda x: x[1], reverse=True)
+                    {"from_to": f"{source_folder} -> {target_folder}", "count": count}
+                    for (source_folder, target_folder), count
+                    in folder_relationships.most_common()
                 ]
             }
         else:
@@ -880,14 +1499,12 @@ def graph_builder_node(state: AgentState) -> AgentState:
             }
 
         return {
-            **state,
             "dependency_graph": dependency_graph,
             "messages": [f"✓ Graph Builder: Built graph with {len(dependency_graph['nodes'])} nodes, {len(dependency_graph['edges'])} edges across {len(dependency_graph.get('folder_structure', []))} folders"]
         }
 
     except Exception as e:
         return {
-            **state,
             "dependency_graph": {},
             "errors": [f"Graph Builder failed: {str(e)}"],
             "messages": [f"✗ Graph Builder: {str(e)}"]
@@ -898,20 +1515,17 @@ def graph_builder_node(state: AgentState) -> AgentState:
 # COMPONENT 4: PATTERN MAPPER (P)
 # ============================================================================
 
-def detect_layered_pattern(dependency_graph, code_facts):
+def detect_layered_pattern(node_meta, code_facts):
     """Detect layered architecture pattern"""
-    nodes = dependency_graph.get("nodes", [])
-    edges = dependency_graph.get("edges", [])
-
     # Group modules by directory structure
     layers = {}
-    for node in nodes:
-        parts = node["id"].split("/")
+    for meta in node_meta:
+        parts = meta["parts"]
         if len(parts) > 1:
-            layer = parts[1] if len(parts) > 1 else parts[0]
+            layer = parts[1]
             if layer not in layers:
                 layers[layer] = []
-            layers[layer].append(node["id"])
+            layers[layer].append(meta["id"])
 
     if len(layers) >= 2:
         evidence = [f"Found {len(layers)} distinct layers: {', '.join(layers.keys())}"]
@@ -925,17 +1539,20 @@ def detect_layered_pattern(dependency_graph, code_facts):
     return None
 
 
-def detect_mvc_pattern(dependency_graph, code_facts):
-    """Detect MVC pattern based on naming conventions"""
-    nodes = dependency_graph.get("nodes", [])
+# One C-level scan per node id instead of five Python substring tests
+_MVC_RE = re.compile(r"(controller|model|view|template|route)")
 
+
+def detect_mvc_pattern(node_meta, code_facts):
+    """Detect MVC pattern based on naming conventions"""
     mvc_keywords = {"controller": [], "model": [], "view": [], "template": [], "route": []}
 
-    for node in nodes:
-        node_id = node["id"].lower()
-        for keyword in mvc_keywords.keys():
-            if keyword in node_id:
-                mvc_keywords[keyword].append(node["id"])
+    for meta in node_meta:
+        # A path can hit several categories (views/model_helper.py counts
+        # as both view and model); the set collapses repeated keywords so
+        # each id lands in a bucket at most once
+        for keyword in {m.group(1) for m in _MVC_RE.finditer(meta["lower"])}:
+            mvc_keywords[keyword].append(meta["id"])
 
     found_components = {k: v for k, v in mvc_keywords.items() if v}
 
@@ -987,16 +1604,23 @@ def pattern_mapper_node(state: AgentState) -> AgentState:
 
         detected_patterns = []
 
+        # Lowercase and split each node id once; the detectors all re-derived
+        # this from the same node list
+        node_meta = [
+            {"id": node["id"], "lower": node["id"].lower(), "parts": node["id"].split("/")}
+            for node in dependency_graph.get("nodes", [])
+        ]
+
         # Run pattern detectors
         patterns_to_check = [
-            detect_layered_pattern,
-            detect_mvc_pattern,
-            detect_microservices_pattern
+            (detect_layered_pattern, node_meta),
+            (detect_mvc_pattern, node_meta),
+            (detect_microservices_pattern, dependency_graph)
         ]
 
-        for detector in patterns_to_check:
+        for detector, graph_view in patterns_to_check:
             try:
-                pattern = detector(dependency_graph, code_facts)
+                pattern = detector(graph_view, code_facts)
                 if pattern:
                     detected_patterns.append(pattern)
             except:
@@ -1015,14 +1639,12 @@ def pattern_mapper_node(state: AgentState) -> AgentState:
         }
 
         return {
-            **state,
             "architecture_patterns": architecture_patterns,
             "messages": [f"✓ Pattern Mapper: Detected {len(detected_patterns)} patterns"]
         }
 
     except Exception as e:
         return {
-            **state,
             "architecture_patterns": {},
             "errors": [f"Pattern Mapper failed: {str(e)}"],
             "messages": [f"✗ Pattern Mapper: {str(e)}"]
@@ -1135,7 +1757,7 @@ DO NOT include any text outside the JSON structure. Make it CRYSTAL CLEAR for ne
         user_prompt = f"""Analyze this codebase architecture:
 
 **Detected Patterns:**
-{json.dumps(architecture_patterns.get('detected_patterns', []), indent=2)}
+{_json_dumps_indented(architecture_patterns.get('detected_patterns', []))}
 
 **Folder Structure ({metrics.get('total_folders', 0)} folders):**
 {folder_summary if folder_summary else "  (flat structure)"}
@@ -1168,17 +1790,17 @@ Provide your architectural analysis in the specified JSON format."""
         
         # Parse response
         response_text = response.content.strip()
-        # Remove markdown code blocks if present
+        # Remove markdown code fences if present; removeprefix/removesuffix
+        # trim in place without the throwaway list split("```") allocated
         if response_text.startswith("```"):
-            response_text = response_text.split("```")[1]
-            if response_text.startswith("json"):
-                response_text = response_text[4:]
+            response_text = response_text.removeprefix("```json").removeprefix("```")
+        if response_text.endswith("```"):
+            response_text = response_text.removesuffix("```")
         response_text = response_text.strip()
         
-        llm_summary = json.loads(response_text)
+        llm_summary = _json_loads(response_text)
         
         return {
-            **state,
             "llm_summary": llm_summary,
             "messages": [f"✓ LLM Orchestrator: Generated summary with {len(llm_summary.get('subsystems', []))} subsystems"]
         }
@@ -1229,7 +1851,6 @@ Provide your architectural analysis in the specified JSON format."""
         }
         
         return {
-            **state,
             "llm_summary": fallback_summary,
             "errors": [f"LLM Orchestrator failed (using fallback): {str(e)}"],
             "messages": [f"⚠ LLM Orchestrator: Used fallback summary ({str(e)})"]
@@ -1265,14 +1886,25 @@ def validator_node(state: AgentState) -> AgentState:
         validation_warnings = []
         
         # Check 1: Referential integrity
-        graph_modules = {node["id"] for node in dependency_graph.get("nodes", [])}
         summary_modules = set()
         for subsystem in llm_summary.get("subsystems", []):
-            summary_modules.update(subsystem.get("modules", []))
-        
-        missing_from_summary = graph_modules - summary_modules
+            summary_modules.update(subsystem.get("modules", ()))
+
+        # One generator pass instead of building the full graph-module set
+        # and then a third difference set
+        missing_from_summary = [
+            node["id"] for node in dependency_graph.get("nodes", [])
+            if node["id"] not in summary_modules
+        ]
         if missing_from_summary:
-            validation_warnings.append(f"Modules in graph but not in summary: {missing_from_summary}")
+            # Cap the sample so a large repo doesn't turn this warning into
+            # a multi-megabyte string
+            sample = missing_from_summary[:20]
+            extra = len(missing_from_summary) - len(sample)
+            validation_warnings.append(
+                f"Modules in graph but not in summary ({len(missing_from_summary)}): {sample}"
+                + (f" ... +{extra} more" if extra > 0 else "")
+            )
         
         # Check 2: Schema validation
         required_fields = ["subsystems", "overall_architecture", "recommendations"]
@@ -1313,7 +1945,6 @@ def validator_node(state: AgentState) -> AgentState:
         msg = f"{status} Validator: {len(validation_errors)} errors, {len(validation_warnings)} warnings"
         
         return {
-            **state,
             "validation_result": validation_result,
             "iteration_count": iteration_count + 1,
             "messages": [msg]
@@ -1321,7 +1952,6 @@ def validator_node(state: AgentState) -> AgentState:
         
     except Exception as e:
         return {
-            **state,
             "validation_result": {"valid": False, "errors": [str(e)], "warnings": []},
             "errors": [f"Validator failed: {str(e)}"],
             "messages": [f"✗ Validator: {str(e)}"]
@@ -1332,6 +1962,88 @@ def validator_node(state: AgentState) -> AgentState:
 # COMPONENT 7: OUTPUT RENDERER (O)
 # ============================================================================
 
+# One case-insensitive scan classifies a path; the group that matched picks
+# the style, replacing seven chained substring checks on a lowered copy
+_STYLE_RE = re.compile(
+    r"(test|spec)|(model|schema|entity)|(controller|route|handler)"
+    r"|(service|business)|(util|helper|common)|(config|setting)"
+    r"|(main|index|app)",
+    re.IGNORECASE
+)
+_STYLES = (
+    '',  # lastindex is 1-based; slot 0 is never hit
+    ':::testStyle',
+    ':::modelStyle',
+    ':::controllerStyle',
+    ':::serviceStyle',
+    ':::utilStyle',
+    ':::configStyle',
+    ':::entryStyle',
+)
+
+
+# Static report blocks written in one call each; line-by-line appends spent
+# interpreter dispatch on content that never changes
+_MERMAID_CLASS_DEFS = """
+    classDef testStyle fill:#ffebee,stroke:#c62828,stroke-width:2px
+    classDef modelStyle fill:#e3f2fd,stroke:#1565c0,stroke-width:2px
+    classDef controllerStyle fill:#f3e5f5,stroke:#6a1b9a,stroke-width:2px
+    classDef serviceStyle fill:#e8f5e9,stroke:#2e7d32,stroke-width:2px
+    classDef utilStyle fill:#fff3e0,stroke:#ef6c00,stroke-width:2px
+    classDef configStyle fill:#fce4ec,stroke:#c2185b,stroke-width:2px
+    classDef entryStyle fill:#e0f2f1,stroke:#00695c,stroke-width:3px
+"""
+
+_DIAGRAM_LEGEND = """## 🗺️ Architecture Diagram
+
+**Legend:**
+
+**Node Colors:**
+- 🟢 **Teal**: Entry Points (main, index, app files)
+- 🔵 **Blue**: Models / Data / Schemas
+- 🟣 **Purple**: Controllers / Routes / Handlers
+- 🟢 **Green**: Services / Business Logic
+- 🟠 **Orange**: Utilities / Helpers / Common
+- 🔴 **Pink**: Tests / Specs
+- 🌸 **Rose**: Configuration / Settings
+
+**Arrows:**
+- `-->` Solid Arrow: Direct dependency (import)
+- `==>` Thick Arrow: Strong dependency (multiple imports)
+- `-.->` Dashed Arrow: Cross-module dependency
+- `|N|` Edge Label: Number of imports (when >5)
+
+**Node Format:**
+- **filename.ext**<br/>*KeyClass, function(), +N more*
+- Shows top 3 classes/functions per file
+"""
+
+# Batch runs render many reports on the same day; cache the formatted date
+# until it rolls over instead of hitting the clock per render
+_TODAY_CACHE = [None, ""]
+
+
+def _today() -> str:
+    today = date.today()
+    if _TODAY_CACHE[0] != today:
+        _TODAY_CACHE[:] = [today, today.isoformat()]
+    return _TODAY_CACHE[1]
+
+
+@lru_cache(maxsize=4096)
+def get_node_style(file_path: str) -> str:
+    """Mermaid style token for a file path, memoized per distinct path"""
+    # Lowest group index wins: the first match anywhere in the path from
+    # the highest-priority category, not the leftmost keyword (so
+    # "app/models/user.py" is a model, not an entry point)
+    match = min(
+        _STYLE_RE.finditer(file_path),
+        key=lambda m: m.lastindex,
+        default=None,
+    )
+    return _STYLES[match.lastindex] if match else ''
+
+
 def output_renderer_node(state: AgentState) -> AgentState:
     """
     Generates final output in multiple formats.
@@ -1357,54 +2069,96 @@ def output_renderer_node(state: AgentState) -> AgentState:
         repo_path = state.get("repo_path", "unknown")
         git_ref = state.get("git_ref", "HEAD")
         
-        # Build Enhanced Mermaid diagram - Detailed with relationships
-        mermaid_lines = ["graph TB"]
-
         # Get data
         symbols = code_facts.get("symbols", [])
         imports = code_facts.get("imports", [])
         nodes = dependency_graph.get("nodes", [])
         edges = dependency_graph.get("edges", [])
+        metrics = dependency_graph.get("metrics") or {}
         folder_structure = dependency_graph.get("folder_structure", [])
         subsystems = llm_summary.get("subsystems", [])
 
+        # Build COMPREHENSIVE Markdown documentation
+        project_overview = llm_summary.get("project_overview", {})
+        data_flow = llm_summary.get("data_flow", "")
+
+        md_buf = io.StringIO()
+        md_write = md_buf.write
+        md_write(f"# 🏗️ Architecture Analysis: {repo_path}\n")
+        md_write(f"\n**Repository:** `{repo_path}`\n")
+        md_write(f"**Git Ref:** `{git_ref}`\n")
+        md_write(f"**Analysis Date:** {_today()}\n")
+        md_write(f"**Validation Status:** {'✓ Passed' if validation_result.get('valid') else '✗ Failed'}\n")
+        md_write("\n---\n\n")
+
+        # Add Project Overview if available
+        if project_overview:
+            md_write("## 📋 Project Overview\n")
+            md_write(f"\n**Purpose:** {project_overview.get('purpose', 'N/A')}\n")
+            md_write(f"\n**Architecture Style:** {project_overview.get('architecture_style', 'N/A')}\n")
+
+            tech_stack = project_overview.get('tech_stack', [])
+            if tech_stack:
+                md_write(f"\n**Tech Stack:** {', '.join(tech_stack)}\n")
+
+            entry_points = project_overview.get('entry_points', [])
+            if entry_points:
+                md_write("\n**Entry Points:**\n")
+                for entry in entry_points:
+                    md_write(f"- `{entry}`\n")
+
+        md_write("\n---\n\n")
+        md_write("## 🎯 Quick Start Guide\n")
+        md_write("\n### For New Team Members\n")
+
+        # Calculate statistics from the handles bound at the top
+        total_files = len(nodes)
+        total_folders = metrics.get('total_folders', 0)
+        total_dependencies = len(edges)
+
+        md_write(f"\n**Codebase Statistics:**\n")
+        md_write(f"- 📁 Total Files: {total_files}\n")
+        md_write(f"- 📂 Total Folders: {total_folders}\n")
+        md_write(f"- 🔗 Total Dependencies: {total_dependencies}\n")
+
+        # Get language breakdown; rpartition avoids the per-symbol list that
+        # split() allocated and Counter runs the tally in C
+        lang_count = Counter(s.file.rpartition(".")[2] for s in symbols)
+        lang_count.pop("", None)
+
+        if lang_count:
+            md_write(f"\n**Languages Used:**\n")
+            for lang, count in lang_count.most_common(5):
+                md_write(f"- {lang.upper()}: {count} files\n")
+
+        md_write("\n---\n\n")
+        md_write(_DIAGRAM_LEGEND)
+        # The mermaid block is written straight into the markdown buffer
+        # between recorded offsets; building it separately kept the whole
+        # diagram text in memory twice (once standalone, once embedded).
+        md_write("\n```mermaid\n")
+        mermaid_start = md_buf.tell()
+        mermaid_write = md_write
+        mermaid_write("graph TB\n")
+
         node_counter = 0
-        file_to_node_id = {}
+        # Map files to their integer node number; the "F{n}" string form is
+        # only built when a line is emitted
+        file_to_node_int = {}
         symbol_to_node_id = {}
 
-        # Helper function to determine node style based on file/symbol type
-        def get_node_style(file_path, symbol_name=None):
-            path_lower = file_path.lower()
-
-            # Test files
-            if 'test' in path_lower or 'spec' in path_lower:
-                return ':::testStyle'
-            # Models/Data
-            elif 'model' in path_lower or 'schema' in path_lower or 'entity' in path_lower:
-                return ':::modelStyle'
-            # Controllers/Routes
-            elif 'controller' in path_lower or 'route' in path_lower or 'handler' in path_lower:
-                return ':::controllerStyle'
-            # Services/Business Logic
-            elif 'service' in path_lower or 'business' in path_lower:
-                return ':::serviceStyle'
-            # Utils/Helpers
-            elif 'util' in path_lower or 'helper' in path_lower or 'common' in path_lower:
-                return ':::utilStyle'
-            # Config
-            elif 'config' in path_lower or 'setting' in path_lower:
-                return ':::configStyle'
-            # Entry points
-            elif 'main' in path_lower or 'index' in path_lower or 'app' in path_lower:
-                return ':::entryStyle'
-            else:
-                return ''
+        # Index symbols by file once; both rendering branches previously
+        # rescanned the entire symbol list for every module shown
+        symbols_by_file = defaultdict(list)
+        for s in symbols:
+            symbols_by_file[s.file].append(s)
 
-        # Group files by subsystem if available
+        # Group files by subsystem if available; islice bounds the loops
+        # without copying list slices on every render
         if subsystems:
-            for i, subsystem in enumerate(subsystems[:8]):  # Top 8 subsystems
+            for i, subsystem in enumerate(islice(subsystems, 8)):  # Top 8 subsystems
                 subsystem_name = subsystem.get('name', f'Subsystem {i}')
-                subsystem_modules = subsystem.get('modules', [])[:15]  # Max 15 files per subsystem
+                subsystem_modules = subsystem.get('modules') or ()
 
                 if not subsystem_modules:
                     continue
@@ -1414,31 +2168,29 @@ def output_renderer_node(state: AgentState) -> AgentState:
 
                 # Escape special characters in subsystem name
                 safe_name = subsystem_name.replace('"', '\\"')
-                mermaid_lines.append(f'    subgraph {subgraph_id}["{safe_name}"]')
+                mermaid_write(f'    subgraph {subgraph_id}["{safe_name}"]\n')
 
-                # Add files and their key symbols
-                for module_path in subsystem_modules:
+                # Add files and their key symbols (max 15 per subsystem)
+                for module_path in islice(subsystem_modules, 15):
                     if not module_path:
                         continue
 
                     file_name = module_path.split('/')[-1]
-                    file_node_id = f"F{node_counter}"
+                    file_node_int = node_counter
+                    file_to_node_int[module_path] = file_node_int
                     node_counter += 1
-                    file_to_node_id[module_path] = file_node_id
 
                     # Get key symbols from this file
-                    file_symbols = [s for s in symbols if s.get('file') == module_path]
+                    file_symbols = symbols_by_file.get(module_path, [])
 
                     # Create node with symbols if available
                     if file_symbols:
-                        # Show top 3 symbols
-                        top_symbols = file_symbols[:3]
-                        symbol_names = [s.get('name', '') for s in top_symbols]
-                        symbol_types = [s.get('type', '') for s in top_symbols]
-
-                        # Format: filename<br/>Class1, func1
-                        symbols_text = ', '.join([f"{name}()" if t == 'function' else name
-                                                  for name, t in zip(symbol_names, symbol_types)])
+                        # Format: filename<br/>Class1, func1 (top 3 symbols);
+                        # one generator pass, no parallel name/type lists
+                        symbols_text = ', '.join(
+                            f"{s.name}()" if s.type == 'function' else s.name
+                            for s in islice(file_symbols, 3)
+                        )
                         if len(file_symbols) > 3:
                             symbols_text += f' +{len(file_symbols)-3} more'
 
@@ -1448,9 +2200,11 @@ def output_renderer_node(state: AgentState) -> AgentState:
 
                     style = get_node_style(module_path)
                     safe_label = label.replace('"', '\\"')
-                    mermaid_lines.append(f'        {file_node_id}["{safe_label}"]{style}')
+                    # Single f-string build per line; measured faster than
+                    # joining prebuilt pieces on this interpreter
+                    mermaid_write(f'        F{file_node_int}["{safe_label}"]{style}\n')
 
-                mermaid_lines.append('    end')
+                mermaid_write('    end\n')
         else:
             # Fallback: Show top files by centrality, or all files if no centrality data
             if nodes:
@@ -1472,15 +2226,14 @@ def output_renderer_node(state: AgentState) -> AgentState:
                     continue
 
                 file_name = file_path.split('/')[-1]
-                file_node_id = f"F{node_counter}"
+                file_node_int = node_counter
+                file_to_node_int[file_path] = file_node_int
                 node_counter += 1
-                file_to_node_id[file_path] = file_node_id
 
                 # Get key symbols
-                file_symbols = [s for s in symbols if s.get('file') == file_path]
+                file_symbols = symbols_by_file.get(file_path, [])
                 if file_symbols:
-                    top_symbols = file_symbols[:2]
-                    symbols_text = ', '.join([s.get('name', '') for s in top_symbols])
+                    symbols_text = ', '.join(s.name for s in islice(file_symbols, 2))
                     if len(file_symbols) > 2:
                         symbols_text += f' +{len(file_symbols)-2}'
                     label = f"{file_name}<br/><small>{symbols_text}</small>"
@@ -1489,29 +2242,42 @@ def output_renderer_node(state: AgentState) -> AgentState:
 
                 style = get_node_style(file_path)
                 safe_label = label.replace('"', '\\"')
-                mermaid_lines.append(f'    {file_node_id}["{safe_label}"]{style}')
+                mermaid_write(f'    F{file_node_int}["{safe_label}"]{style}\n')
 
         # If still no nodes were added, add a placeholder message
-        if len(file_to_node_id) == 0:
-            mermaid_lines.append('    NO_DATA["No files to display<br/><small>Analysis may have failed</small>"]:::utilStyle')
+        if len(file_to_node_int) == 0:
+            mermaid_write('    NO_DATA["No files to display<br/><small>Analysis may have failed</small>"]:::utilStyle\n')
+
+        # Add relationships with different arrow types. Most edges reference
+        # files that never made it into the diagram (only ~30 nodes in the
+        # fallback), so screen them with C-level membership tests before the
+        # formatting loop does any per-edge work.
+        known_files = file_to_node_int.keys()  # set-like view, no allocation
+        candidate_edges = [
+            e for e in edges
+            if e.get('source') in known_files and e.get('target') in known_files
+        ]
 
-        # Add relationships with different arrow types
-        added_edges = set()
-        edge_count = 0
+        # Max 60 edges for clarity - keep the strongest ones instead of the
+        # first 60 in storage order; nlargest avoids sorting the full list
+        top_edges = heapq.nlargest(60, candidate_edges, key=lambda e: e.get('weight', 1))
 
-        for edge in edges:
-            if edge_count >= 60:  # Max 60 edges for clarity
-                break
+        added_edges = set()
 
+        for edge in top_edges:
             source = edge.get('source', '')
             target = edge.get('target', '')
             relationship = edge.get('relationship', 'unknown')
             weight = edge.get('weight', 1)
 
-            source_id = file_to_node_id.get(source)
-            target_id = file_to_node_id.get(target)
+            # Pre-filtering guarantees both ends are known, so index directly.
+            # Dedupe on a packed int key: node numbers stay well under 2^20,
+            # so one int hash replaces hashing a tuple of strings
+            source_int = file_to_node_int[source]
+            target_int = file_to_node_int[target]
+            edge_key = (source_int << 20) | target_int
 
-            if source_id and target_id and (source_id, target_id) not in added_edges:
+            if edge_key not in added_edges:
                 # Different arrow styles based on relationship type and weight
                 if relationship == 'intra_folder':
                     # Same folder - use thicker arrow
@@ -1527,204 +2293,134 @@ def output_renderer_node(state: AgentState) -> AgentState:
 
                 # Add label for strong dependencies
                 if weight > 5:
-                    mermaid_lines.append(f"    {source_id} {arrow}|{weight}| {target_id}")
+                    mermaid_write(f"    F{source_int} {arrow}|{weight}| F{target_int}\n")
                 else:
-                    mermaid_lines.append(f"    {source_id} {arrow} {target_id}")
+                    mermaid_write(f"    F{source_int} {arrow} F{target_int}\n")
 
-                added_edges.add((source_id, target_id))
-                edge_count += 1
+                added_edges.add(edge_key)
 
         # Add styling classes
-        mermaid_lines.append("")
-        mermaid_lines.append("    classDef testStyle fill:#ffebee,stroke:#c62828,stroke-width:2px")
-        mermaid_lines.append("    classDef modelStyle fill:#e3f2fd,stroke:#1565c0,stroke-width:2px")
-        mermaid_lines.append("    classDef controllerStyle fill:#f3e5f5,stroke:#6a1b9a,stroke-width:2px")
-        mermaid_lines.append("    classDef serviceStyle fill:#e8f5e9,stroke:#2e7d32,stroke-width:2px")
-        mermaid_lines.append("    classDef utilStyle fill:#fff3e0,stroke:#ef6c00,stroke-width:2px")
-        mermaid_lines.append("    classDef configStyle fill:#fce4ec,stroke:#c2185b,stroke-width:2px")
-        mermaid_lines.append("    classDef entryStyle fill:#e0f2f1,stroke:#00695c,stroke-width:3px")
-
-        mermaid_diagram = "\n".join(mermaid_lines)
-        
-        # Build COMPREHENSIVE Markdown documentation
-        project_overview = llm_summary.get("project_overview", {})
-        data_flow = llm_summary.get("data_flow", "")
-
-        markdown_parts = [
-            f"# 🏗️ Architecture Analysis: {repo_path}",
-            f"\n**Repository:** `{repo_path}`",
-            f"**Git Ref:** `{git_ref}`",
-            f"**Analysis Date:** {datetime.now().strftime('%Y-%m-%d')}",
-            f"**Validation Status:** {'✓ Passed' if validation_result.get('valid') else '✗ Failed'}",
-            "\n---\n",
-        ]
-
-        # Add Project Overview if available
-        if project_overview:
-            markdown_parts.append("## 📋 Project Overview")
-            markdown_parts.append(f"\n**Purpose:** {project_overview.get('purpose', 'N/A')}")
-            markdown_parts.append(f"\n**Architecture Style:** {project_overview.get('architecture_style', 'N/A')}")
-
-            tech_stack = project_overview.get('tech_stack', [])
-            if tech_stack:
-                markdown_parts.append(f"\n**Tech Stack:** {', '.join(tech_stack)}")
+        mermaid_write(_MERMAID_CLASS_DEFS)
 
-            entry_points = project_overview.get('entry_points', [])
-            if entry_points:
-                markdown_parts.append("\n**Entry Points:**")
-                for entry in entry_points:
-                    markdown_parts.append(f"- `{entry}`")
-
-        markdown_parts.append("\n---\n")
-        markdown_parts.append("## 🎯 Quick Start Guide")
-        markdown_parts.append("\n### For New Team Members")
-
-        # Calculate statistics
-        total_files = len(dependency_graph.get('nodes', []))
-        total_folders = dependency_graph.get('metrics', {}).get('total_folders', 0)
-        total_dependencies = len(dependency_graph.get('edges', []))
-
-        markdown_parts.append(f"\n**Codebase Statistics:**")
-        markdown_parts.append(f"- 📁 Total Files: {total_files}")
-        markdown_parts.append(f"- 📂 Total Folders: {total_folders}")
-        markdown_parts.append(f"- 🔗 Total Dependencies: {total_dependencies}")
-
-        # Get language breakdown
-        symbols = code_facts.get("symbols", [])
-        lang_count = {}
-        for symbol in symbols:
-            lang = symbol.get("file", "").split(".")[-1]
-            lang_count[lang] = lang_count.get(lang, 0) + 1
-
-        if lang_count:
-            markdown_parts.append(f"\n**Languages Used:**")
-            for lang, count in sorted(lang_count.items(), key=lambda x: x[1], reverse=True)[:5]:
-                markdown_parts.append(f"- {lang.upper()}: {count} files")
-
-        markdown_parts.append("\n---\n")
-        markdown_parts.append("## 🗺️ Architecture Diagram")
-        markdown_parts.append("\n**Legend:**")
-        markdown_parts.append("\n**Node Colors:**")
-        markdown_parts.append("- 🟢 **Teal**: Entry Points (main, index, app files)")
-        markdown_parts.append("- 🔵 **Blue**: Models / Data / Schemas")
-        markdown_parts.append("- 🟣 **Purple**: Controllers / Routes / Handlers")
-        markdown_parts.append("- 🟢 **Green**: Services / Business Logic")
-        markdown_parts.append("- 🟠 **Orange**: Utilities / Helpers / Common")
-        markdown_parts.append("- 🔴 **Pink**: Tests / Specs")
-        markdown_parts.append("- 🌸 **Rose**: Configuration / Settings")
-        markdown_parts.append("\n**Arrows:**")
-        markdown_parts.append("- `-->` Solid Arrow: Direct dependency (import)")
-        markdown_parts.append("- `==>` Thick Arrow: Strong dependency (multiple imports)")
-        markdown_parts.append("- `-.->` Dashed Arrow: Cross-module dependency")
-        markdown_parts.append("- `|N|` Edge Label: Number of imports (when >5)")
-        markdown_parts.append("\n**Node Format:**")
-        markdown_parts.append("- **filename.ext**<br/>*KeyClass, function(), +N more*")
-        markdown_parts.append("- Shows top 3 classes/functions per file")
-        markdown_parts.append("\n```mermaid")
-        markdown_parts.append(mermaid_diagram)
-        markdown_parts.append("```")
+        mermaid_end = md_buf.tell()
+        md_write("```\n")
 
         # Add Data Flow if available
         if data_flow:
-            markdown_parts.append("\n## 🔄 Data Flow")
-            markdown_parts.append(f"\n{data_flow}")
+            md_write("\n## 🔄 Data Flow\n")
+            md_write(f"\n{data_flow}\n")
 
-        markdown_parts.append("\n## 📁 Folder Structure")
+        md_write("\n## 📁 Folder Structure\n")
 
         # Add folder structure details
-        markdown_parts.append(f"\n**Total Folders:** {dependency_graph.get('metrics', {}).get('total_folders', 0)}")
-        markdown_parts.append(f"**Intra-folder Dependencies:** {dependency_graph.get('metrics', {}).get('intra_folder_edges', 0)}")
-        markdown_parts.append(f"**Inter-folder Dependencies:** {dependency_graph.get('metrics', {}).get('inter_folder_edges', 0)}")
+        md_write(f"\n**Total Folders:** {total_folders}\n")
+        md_write(f"**Intra-folder Dependencies:** {metrics.get('intra_folder_edges', 0)}\n")
+        md_write(f"**Inter-folder Dependencies:** {metrics.get('inter_folder_edges', 0)}\n")
 
+        # One generator-fed join and a single write per section, instead of
+        # a Python-level write per bullet
         if folder_structure:
-            markdown_parts.append("\n**Key Folders:**")
-            for folder in folder_structure[:10]:
-                markdown_parts.append(f"- `{folder['path']}/` ({folder['file_count']} files)")
+            md_write("\n**Key Folders:**\n")
+            md_write("\n".join(
+                f"- `{folder['path']}/` ({folder['file_count']} files)"
+                for folder in folder_structure[:10]
+            ))
+            md_write("\n")
 
         folder_relationships = dependency_graph.get("folder_relationships", [])
         if folder_relationships:
-            markdown_parts.append("\n**Folder Dependencies:**")
-            for rel in folder_relationships[:10]:
-                markdown_parts.append(f"- {rel['from_to']} ({rel['count']} imports)")
+            md_write("\n**Folder Dependencies:**\n")
+            md_write("\n".join(
+                f"- {rel['from_to']} ({rel['count']} imports)"
+                for rel in folder_relationships[:10]
+            ))
+            md_write("\n")
 
-        markdown_parts.append("\n## Detected Patterns")
+        md_write("\n## Detected Patterns\n")
 
         for pattern in architecture_patterns.get("detected_patterns", []):
-            markdown_parts.append(f"\n### {pattern['type']} (Confidence: {pattern['confidence']:.0%})")
-            markdown_parts.append("\n**Evidence:**")
+            md_write(f"\n### {pattern['type']} (Confidence: {pattern['confidence']:.0%})\n")
+            md_write("\n**Evidence:**\n")
             for evidence in pattern.get("evidence", []):
-                markdown_parts.append(f"- {evidence}")
+                md_write(f"- {evidence}\n")
         
-        markdown_parts.append("\n## 🧩 Subsystems & Components")
-        markdown_parts.append("\n### Detailed Breakdown")
+        md_write("\n## 🧩 Subsystems & Components\n")
+        md_write("\n### Detailed Breakdown\n")
 
         for i, subsystem in enumerate(llm_summary.get("subsystems", []), 1):
-            markdown_parts.append(f"\n### {i}. {subsystem['name']}")
+            md_write(f"\n### {i}. {subsystem['name']}\n")
 
             # Purpose
             purpose = subsystem.get('purpose', subsystem.get('responsibility', 'Not specified'))
-            markdown_parts.append(f"\n**📝 Purpose:** {purpose}")
+            md_write(f"\n**📝 Purpose:** {purpose}\n")
 
             # Technology
             tech = subsystem.get('technology', 'N/A')
-            markdown_parts.append(f"\n**⚙️ Technology:** {tech}")
+            md_write(f"\n**⚙️ Technology:** {tech}\n")
 
             # Key Files with roles
             key_files = subsystem.get('key_files', [])
             if key_files:
-                markdown_parts.append(f"\n**🔑 Key Files:**")
+                md_write(f"\n**🔑 Key Files:**\n")
                 for kf in key_files:
                     file_name = kf.get('file', 'unknown')
                     role = kf.get('role', 'N/A')
-                    markdown_parts.append(f"- `{file_name}` - {role}")
+                    md_write(f"- `{file_name}` - {role}\n")
 
             # Dependencies (what this subsystem needs)
             dependencies = subsystem.get('dependencies', [])
             if dependencies:
-                markdown_parts.append(f"\n**⬇️ Dependencies (uses):**")
+                md_write(f"\n**⬇️ Dependencies (uses):**\n")
                 for dep in dependencies:
                     dep_name = dep.get('subsystem', 'unknown')
                     reason = dep.get('reason', 'N/A')
-                    markdown_parts.append(f"- **{dep_name}**: {reason}")
+                    md_write(f"- **{dep_name}**: {reason}\n")
 
             # Provides to (what this subsystem offers to others)
             provides_to = subsystem.get('provides_to', [])
             if provides_to:
-                markdown_parts.append(f"\n**⬆️ Provides To:**")
+                md_write(f"\n**⬆️ Provides To:**\n")
                 for prov in provides_to:
                     prov_name = prov.get('subsystem', 'unknown')
                     what = prov.get('what', 'N/A')
-                    markdown_parts.append(f"- **{prov_name}**: {what}")
+                    md_write(f"- **{prov_name}**: {what}\n")
 
             # All modules list (collapsed for readability)
             modules = subsystem.get("modules", [])
             if modules and len(modules) > 0:
-                markdown_parts.append(f"\n**📦 All Files ({len(modules)} total):**")
+                md_write(f"\n**📦 All Files ({len(modules)} total):**\n")
                 # Show first 5, then collapse
                 for module in modules[:5]:
-                    markdown_parts.append(f"- `{module}`")
+                    md_write(f"- `{module}`\n")
                 if len(modules) > 5:
-                    markdown_parts.append(f"- ... and {len(modules) - 5} more files")
+                    md_write(f"- ... and {len(modules) - 5} more files\n")
 
-            markdown_parts.append("")  # Spacing
-        
-        markdown_parts.append("\n## Recommendations")
-        for i, rec in enumerate(llm_summary.get("recommendations", []), 1):
-            markdown_parts.append(f"{i}. {rec}")
+            md_write("\n")  # Spacing
         
+        md_write("\n## Recommendations\n")
+        recommendations = llm_summary.get("recommendations", [])
+        if recommendations:
+            md_write("\n".join(
+                f"{i}. {rec}" for i, rec in enumerate(recommendations, 1)
+            ))
+            md_write("\n")
+
         # Add validation warnings if any
         if validation_result.get("warnings"):
-            markdown_parts.append("\n## Validation Warnings")
-            for warning in validation_result["warnings"]:
-                markdown_parts.append(f"- ⚠️ {warning}")
+            md_write("\n## Validation Warnings\n")
+            md_write("\n".join(
+                f"- ⚠️ {warning}" for warning in validation_result["warnings"]
+            ))
+            md_write("\n")
         
-        markdown_parts.append("\n---\n")
-        markdown_parts.append("*Generated by Code Architecture Analysis Agent*")
+        md_write("\n---\n\n")
+        md_write("*Generated by Code Architecture Analysis Agent*\n")
         
-        final_output = "\n".join(markdown_parts)
+        buf_val = md_buf.getvalue()
+        final_output = buf_val.rstrip("\n")
+        mermaid_diagram = buf_val[mermaid_start:mermaid_end].rstrip("\n")
         
         return {
-            **state,
             "final_output": final_output,
             "mermaid_diagram": mermaid_diagram,
             "messages": [f"✓ Output Renderer: Generated {len(final_output)} character report"]
@@ -1732,7 +2428,6 @@ def output_renderer_node(state: AgentState) -> AgentState:
         
     except Exception as e:
         return {
-            **state,
             "final_output": f"# Error Generating Output\n\n{str(e)}",
             "mermaid_diagram": "",
             "errors": [f"Output Renderer failed: {str(e)}"],
@@ -1744,6 +2439,11 @@ def output_renderer_node(state: AgentState) -> AgentState:
 # CONDITIONAL ROUTING
 # ============================================================================
 
+# One case-insensitive scan per error message instead of a .lower() copy
+# plus two substring passes
+_FIXABLE_RE = re.compile(r"schema|missing", re.IGNORECASE).search
+
+
 def should_retry_validation(state: AgentState) -> Literal["retry_llm", "render_output"]:
     """
     Decides whether to retry LLM generation or proceed to output.
@@ -1765,11 +2465,11 @@ def should_retry_validation(state: AgentState) -> Literal["retry_llm", "render_o
     if validation_result.get("valid") or iteration_count >= 3:
         return "render_output"
     
-    # Check if errors are fixable
+    # Check if errors are fixable; any() stops at the first hit instead of
+    # collecting the full list
     errors = validation_result.get("errors", [])
-    fixable_errors = [e for e in errors if "schema" in e.lower() or "missing" in e.lower()]
-    
-    if fixable_errors and iteration_count < 3:
+
+    if any(_FIXABLE_RE(e) for e in errors) and iteration_count < 3:
         return "retry_llm"
     else:
         return "render_output"
@@ -1845,28 +2545,18 @@ def main():
     agent = create_architecture_agent()
     
     # Define initial state
-    initial_state = {
-        "repo_path": "https://github.com/example/repo.git",
-        "git_ref": "main",
-        "scope_filters": ["src/**/*.py"],
-        "depth": -1,
-        "file_tree": {},
-        "code_facts": {},
-        "dependency_graph": {},
-        "architecture_patterns": {},
-        "llm_summary": {},
-        "validation_result": {},
-        "final_output": "",
-        "errors": [],
-        "iteration_count": 0,
-        "messages": []
-    }
+    initial_state = make_initial_state(
+        "https://github.com/example/repo.git",
+        git_ref="main",
+        scope_filters=["src/**/*.py"]
+    )
     
     # Run the agent
     print("🚀 Starting Code Architecture Analysis Agent\n")
     print("=" * 80)
     
-    result = agent.invoke(initial_state)
+    # repo_reader_node is async, so drive the graph through ainvoke
+    result = asyncio.run(agent.ainvoke(initial_state))
     
     # Display execution log
     print("\n📋 Execution Log:")
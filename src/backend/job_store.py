@@ -0,0 +1,153 @@
+"""
+Job and result storage for the analysis API.
+
+Uses Redis (redis.asyncio) when REDIS_URL is set, so that multiple uvicorn
+workers share the same view of jobs and results survive process restarts.
+Falls back to plain in-process dicts for single-worker local development.
+"""
+
+import json
+from typing import Optional, List
+
+from cachetools import TTLCache
+
+
+class JobStore:
+    """
+    Key-value storage for analysis jobs and cached results.
+
+    Jobs live under `job:{job_id}`, results under `result:{job_id}` and
+    the server-side call-flow index under `callidx:{job_id}`. Results and
+    indexes carry a TTL so completed payloads (markdown output, symbol
+    tables, graph edges) are evicted instead of accumulating forever.
+
+    Args:
+        redis_url: Redis connection URL; when None, an in-process dict
+            backend is used (single worker only)
+        job_ttl: Seconds to keep job records (Redis backend)
+        result_ttl: Seconds to keep analysis results (Redis backend)
+    """
+
+    def __init__(self, redis_url: Optional[str] = None,
+                 job_ttl: int = 86400, result_ttl: int = 3600):
+        self.job_ttl = job_ttl
+        self.result_ttl = result_ttl
+        self.redis = None
+
+        if redis_url:
+            import redis.asyncio as aioredis
+            self.redis = aioredis.from_url(redis_url, decode_responses=True)
+
+        # In-process fallback storage, bounded with LRU + TTL eviction so a
+        # long-running single-worker server doesn't leak completed jobs and
+        # their (large) results - mirrors the TTLs used on the Redis side
+        self._jobs = TTLCache(maxsize=2000, ttl=job_ttl)
+        self._results = TTLCache(maxsize=500, ttl=result_ttl)
+        self._call_indexes = TTLCache(maxsize=500, ttl=result_ttl)
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    async def set_job(self, job_id: str, job: dict):
+        """Store a full job record"""
+        if self.redis:
+            await self.redis.set(f"job:{job_id}", json.dumps(job), ex=self.job_ttl)
+        else:
+            self._jobs[job_id] = job
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """Fetch a job record, or None if unknown"""
+        if self.redis:
+            raw = await self.redis.get(f"job:{job_id}")
+            return json.loads(raw) if raw else None
+        return self._jobs.get(job_id)
+
+    async def update_job(self, job_id: str, **fields) -> Optional[dict]:
+        """Merge fields into an existing job record"""
+        job = await self.get_job(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        await self.set_job(job_id, job)
+        return job
+
+    async def delete_job(self, job_id: str):
+        """Remove a job record"""
+        if self.redis:
+            await self.redis.delete(f"job:{job_id}")
+        else:
+            self._jobs.pop(job_id, None)
+
+    async def list_jobs(self) -> List[dict]:
+        """Return all job records"""
+        if self.redis:
+            keys = [key async for key in self.redis.scan_iter(match="job:*")]
+            if not keys:
+                return []
+            return [json.loads(raw) for raw in await self.redis.mget(keys) if raw]
+        return list(self._jobs.values())
+
+    async def count_jobs(self) -> int:
+        """Number of stored jobs"""
+        if self.redis:
+            return sum([1 async for _ in self.redis.scan_iter(match="job:*")])
+        return len(self._jobs)
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+
+    async def set_result(self, job_id: str, result: dict):
+        """Store an analysis result with TTL eviction"""
+        if self.redis:
+            await self.redis.set(f"result:{job_id}", json.dumps(result), ex=self.result_ttl)
+        else:
+            self._results[job_id] = result
+
+    async def get_result(self, job_id: str) -> Optional[dict]:
+        """Fetch an analysis result, or None if missing/expired"""
+        if self.redis:
+            raw = await self.redis.get(f"result:{job_id}")
+            return json.loads(raw) if raw else None
+        return self._results.get(job_id)
+
+    async def delete_result(self, job_id: str):
+        """Remove a cached result"""
+        if self.redis:
+            await self.redis.delete(f"result:{job_id}")
+        else:
+            self._results.pop(job_id, None)
+
+    async def count_results(self) -> int:
+        """Number of cached results"""
+        if self.redis:
+            return sum([1 async for _ in self.redis.scan_iter(match="result:*")])
+        return len(self._results)
+
+    # ------------------------------------------------------------------
+    # Call-flow indexes
+    # ------------------------------------------------------------------
+    # Stored apart from results: the index is a server-side lookup aid,
+    # so it must not show up in result counts or occupy result-cache slots
+
+    async def set_call_index(self, job_id: str, index: dict):
+        """Store a job's caller -> calls index with TTL eviction"""
+        if self.redis:
+            await self.redis.set(f"callidx:{job_id}", json.dumps(index), ex=self.result_ttl)
+        else:
+            self._call_indexes[job_id] = index
+
+    async def get_call_index(self, job_id: str) -> Optional[dict]:
+        """Fetch a job's call index, or None if missing/expired"""
+        if self.redis:
+            raw = await self.redis.get(f"callidx:{job_id}")
+            return json.loads(raw) if raw else None
+        return self._call_indexes.get(job_id)
+
+    async def delete_call_index(self, job_id: str):
+        """Remove a cached call index"""
+        if self.redis:
+            await self.redis.delete(f"callidx:{job_id}")
+        else:
+            self._call_indexes.pop(job_id, None)
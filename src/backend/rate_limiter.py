@@ -2,9 +2,11 @@
 Rate limiter for API endpoints to prevent abuse
 """
 
+import asyncio
+import time
+
 from fastapi import Request, HTTPException
-from collections import defaultdict
-from datetime import datetime, timedelta
+from collections import OrderedDict, deque
 
 
 class RateLimiter:
@@ -16,10 +18,23 @@ class RateLimiter:
         window_hours: Time window in hours for rate limiting
     """
 
+    # Oldest-seen IPs are evicted past this point so adversarial clients
+    # churning addresses can't grow the table without bound
+    MAX_TRACKED_IPS = 100_000
+    _LOCK_SHARDS = 32
+
     def __init__(self, max_requests: int = 10, window_hours: int = 24):
         self.max_requests = max_requests
-        self.window = timedelta(hours=window_hours)
-        self.requests = defaultdict(list)
+        # Integer nanoseconds on the monotonic clock: comparisons are plain
+        # int ops instead of timedelta arithmetic, and wall-clock changes
+        # can't widen or shrink the window
+        self.window_ns = window_hours * 3600 * 1_000_000_000
+        # LRU-ordered: an IP moves to the end on every request it makes
+        self.requests: OrderedDict = OrderedDict()
+        # The check-then-append below must be atomic per IP or two
+        # concurrent requests can both slip under the limit; a fixed pool
+        # of lock shards bounds memory regardless of client count
+        self._locks = [asyncio.Lock() for _ in range(self._LOCK_SHARDS)]
 
     async def check_rate_limit(self, request: Request):
         """
@@ -32,20 +47,30 @@ class RateLimiter:
             HTTPException: If rate limit is exceeded (429 status code)
         """
         ip = request.client.host
-        now = datetime.now()
-
-        # Clean old requests outside the time window
-        self.requests[ip] = [
-            timestamp for timestamp in self.requests[ip]
-            if now - timestamp < self.window
-        ]
-
-        # Check if rate limit exceeded
-        if len(self.requests[ip]) >= self.max_requests:
-            raise HTTPException(
-                status_code=429,
-                detail=f"Rate limit exceeded. You can make {self.max_requests} analyses per day. Try again tomorrow."
-            )
-
-        # Add current request timestamp
-        self.requests[ip].append(now)
+
+        async with self._locks[hash(ip) & (self._LOCK_SHARDS - 1)]:
+            now_ns = time.monotonic_ns()
+            cutoff = now_ns - self.window_ns
+
+            timestamps = self.requests.get(ip)
+            if timestamps is None:
+                timestamps = self.requests[ip] = deque()
+                if len(self.requests) > self.MAX_TRACKED_IPS:
+                    self.requests.popitem(last=False)
+            else:
+                self.requests.move_to_end(ip)
+
+            # Timestamps are appended in order, so expired ones leave from
+            # the left - no per-request rebuild of the whole list
+            while timestamps and timestamps[0] < cutoff:
+                timestamps.popleft()
+
+            # Check if rate limit exceeded
+            if len(timestamps) >= self.max_requests:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Rate limit exceeded. You can make {self.max_requests} analyses per day. Try again tomorrow."
+                )
+
+            # Add current request timestamp
+            timestamps.append(now_ns)
@@ -0,0 +1,32 @@
+"""
+arq worker that runs analyses outside the API processes.
+
+Start with:
+    arq worker.WorkerSettings
+
+BackgroundTasks run inside whichever uvicorn worker accepted the request,
+so analyses compete with HTTP/WebSocket traffic there and die silently if
+the process is recycled. When REDIS_URL is set the API enqueues jobs here
+instead; job state and results flow through the shared Redis-backed
+JobStore, so any API worker can serve status polls and results. WebSocket
+progress frames are only pushed by the process actually running the
+analysis - clients connected to other workers fall back to REST polling.
+"""
+
+import os
+
+from arq.connections import RedisSettings
+
+from backend_server import run_analysis_async, AnalysisRequest
+
+
+async def analyze_job(ctx, job_id: str, request_dict: dict):
+    """Run one queued analysis to completion"""
+    await run_analysis_async(job_id, AnalysisRequest(**request_dict))
+
+
+class WorkerSettings:
+    functions = [analyze_job]
+    redis_settings = RedisSettings.from_dsn(os.getenv("REDIS_URL", "redis://localhost:6379"))
+    max_jobs = int(os.getenv("ARQ_MAX_JOBS", "2"))
+    job_timeout = 1800  # Analyses can clone + parse large repos